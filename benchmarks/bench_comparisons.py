@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of :func:`spotidalyfin.utils.comparisons.weighted_word_overlap`.
+
+Compares the current implementation (precompiled patterns, memoized tokens) with the previous one (normalizing both
+texts on every call) on names compared repeatedly, like during matching.
+
+Usage: python benchmarks/bench_comparisons.py
+"""
+import random
+import re
+import sys
+import timeit
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spotidalyfin.utils.comparisons import weighted_word_overlap  # noqa: E402
+
+NAMES = [
+    "Bohemian Rhapsody - Remastered 2011",
+    "Bohemian Rhapsody (Remastered 2011)",
+    "A Night At The Opera (2011 Remaster)",
+    "A Night At The Opera (Deluxe Edition)",
+    "Don't Stop Me Now (feat. Someone) - Live",
+    "Song Title - From \"Some Movie\" Soundtrack",
+    "Song Title (From \"Some Movie\" Soundtrack)",
+    "The Dark Side of the Moon (UK Original Album)",
+    "Around the World / Harder Better Faster Stronger (Radio Edit)",
+    "Harder, Better, Faster, Stronger",
+    "Clair de Lune (Bande Originale du Film)",
+    "Get Lucky (Radio Edit) [feat. Pharrell Williams and Nile Rodgers]",
+]
+
+
+def normalize_uncached(text: str) -> list[str]:
+    text = text.lower()
+    text = re.sub(r'\((feat|with|edition|radio|bande|original|ultimate)[^)]*\)', '', text)
+    text = re.sub(r'\(uk.*?album\)', '', text)
+    text = text.replace("remix", "")
+    tokens = text.split()
+    tokens = [re.sub(r'\W+', '', token) for token in tokens]
+    return [token for token in tokens if token != '']
+
+
+def weighted_word_overlap_uncached(a: str, b: str) -> float:
+    tokens_a = normalize_uncached(a)
+    tokens_b = normalize_uncached(b)
+    if not tokens_a or not tokens_b:
+        return 0.0
+    counter_a = Counter(tokens_a)
+    counter_b = Counter(tokens_b)
+    return sum((counter_a & counter_b).values()) / sum((counter_a | counter_b).values())
+
+
+def main(comparisons: int = 200_000):
+    random.seed(0)
+    pairs = [(random.choice(NAMES), random.choice(NAMES)) for _ in range(comparisons)]
+
+    for a, b in pairs[:1000]:
+        assert weighted_word_overlap(a, b) == weighted_word_overlap_uncached(a, b)
+
+    for name, func in (("before", weighted_word_overlap_uncached), ("after", weighted_word_overlap)):
+        duration = timeit.timeit(lambda: [func(a, b) for a, b in pairs], number=1)
+        print(f"{name:>6}: {comparisons / duration:>12,.0f} comparisons/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from spotidalyfin import APPLICATION_PATH
@@ -7,8 +8,17 @@ _config = {
     "out-dir": Path("~/Music/spotidalyfin").expanduser(),
     "dl-dir": Path("/tmp/spotidalyfin"),
     "config-dir": Path("~/.config/spotidalyfin").expanduser(),
+    "cache-dir": Path("~/.cache/spotidalyfin").expanduser(),
     "secrets": APPLICATION_PATH / "spotidalyfin.secrets",
     "quality": 3,
+    "spotify-workers": 4,
+    "match-workers": 4,
+    "tidal-cache-ttl": 30,
+    "download-workers": 5,
+    "adaptive-downloads": False,
+    "segment-workers": 4,
+    "stream-ffmpeg": True,
+    "finalize-workers": os.cpu_count() or 2,
     "jellyfin-metadata-dir": Path("/var/lib/jellyfin/metadata")
 }
 
@@ -1,19 +1,27 @@
-from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
-from typing import Annotated, List
+from typing import Annotated, Callable, List, Iterator, Iterable, Optional
 
-import rich
 import typer
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.progress import Progress
 from tidalapi import Track
 
 from spotidalyfin import cfg
 from spotidalyfin.db.database import Database
-from spotidalyfin.managers.tidal_manager import TidalManager
+from spotidalyfin.managers.tidal_manager import TidalManager, RATE_LIMITER as TIDAL_RATE_LIMITER
 from spotidalyfin.utils.file_utils import file_to_list, parse_secrets_file
+from spotidalyfin.utils.library import LibraryIndex
 from spotidalyfin.utils.logger import log, setup_logger
+from spotidalyfin.utils.pipeline import buffered, unordered_map
+from spotidalyfin.utils.scheduler import DownloadScheduler
 from .managers.jellyfin_manager import JellyfinManager
-from .managers.spotify_manager import SpotifyManager
+from .managers.spotify_manager import SpotifyManager, SpotifyTrack
+
+SPOTIFY_PAGES_BUFFER = 4
+DOWNLOADS_BUFFER = 20
 
 app = typer.Typer()
 
@@ -29,10 +37,20 @@ app.add_typer(helpers_app, name="helpers")
 
 
 @app.callback()
-def app_callback(debug: bool = cfg.get("debug"), secrets: Path = cfg.get("secrets")):
+def app_callback(debug: bool = cfg.get("debug"), secrets: Path = cfg.get("secrets"),
+                 spotify_workers: Annotated[int, typer.Option(
+                     help="Maximum number of Spotify pages fetched concurrently")] = cfg.get("spotify-workers"),
+                 full_scan: Annotated[bool, typer.Option(
+                     help="Ignore the state saved by previous runs and process every track")] = False,
+                 tidal_cache_ttl: Annotated[int, typer.Option(
+                     help="Number of days the metadata of the matched Tidal tracks is cached")] = cfg.get(
+                     "tidal-cache-ttl")):
     """Callback for app configuration."""
     cfg.put("debug", debug)
     cfg.put("secrets", secrets)
+    cfg.put("spotify-workers", spotify_workers)
+    cfg.put("full-scan", full_scan)
+    cfg.put("tidal-cache-ttl", tidal_cache_ttl)
     cfg.get_config().update(parse_secrets_file(secrets))
 
 
@@ -43,7 +61,25 @@ def download_callback(
         out_dir: Annotated[Path, typer.Option(help="Output directory for downloaded tracks")] = cfg.get("out-dir"),
         dl_dir: Annotated[Path, typer.Option(help="Temporary directory for downloaded tracks")] = cfg.get("dl-dir"),
         ignore_jellyfin: Annotated[bool, typer.Option(help="Doesn't check if song is already on Jellyfin")] = False,
-        m4a2flac: Annotated[bool, typer.Option(help="Convert M4A files to FLAC")] = True
+        m4a2flac: Annotated[bool, typer.Option(help="Convert M4A files to FLAC")] = True,
+        match_workers: Annotated[int, typer.Option(
+            help="Number of tracks matched with Tidal concurrently")] = cfg.get("match-workers"),
+        group_albums: Annotated[bool, typer.Option(
+            help="Match the tracks from the same album together (resolving the Tidal album once)")] = True,
+        download_workers: Annotated[int, typer.Option(
+            help="Number of tracks downloaded concurrently (initial number with --adaptive-downloads)")] = cfg.get(
+            "download-workers"),
+        adaptive_downloads: Annotated[bool, typer.Option(
+            help="Tune the number of concurrent downloads from the observed throughput and errors")] = False,
+        segment_workers: Annotated[int, typer.Option(
+            help="Number of segments of a track downloaded concurrently")] = cfg.get("segment-workers"),
+        finalize_workers: Annotated[int, typer.Option(
+            help="Number of downloaded tracks converted and tagged concurrently")] = cfg.get("finalize-workers"),
+        stream_ffmpeg: Annotated[bool, typer.Option(
+            help="Convert M4A files to FLAC while they are downloaded (falls back to a temporary file)")] = cfg.get(
+            "stream-ffmpeg"),
+        retry_unmatched: Annotated[bool, typer.Option(
+            help="Search again the tracks that could not be matched, without waiting for their retry delay")] = False
 ):
     """Callback for download settings."""
     cfg.put("quality", quality)
@@ -51,6 +87,14 @@ def download_callback(
     cfg.put("dl-dir", dl_dir)
     cfg.put("ignore-jellyfin", ignore_jellyfin)
     cfg.put("m4a2flac", m4a2flac)
+    cfg.put("match-workers", match_workers)
+    cfg.put("group-albums", group_albums)
+    cfg.put("download-workers", download_workers)
+    cfg.put("adaptive-downloads", adaptive_downloads)
+    cfg.put("segment-workers", segment_workers)
+    cfg.put("finalize-workers", finalize_workers)
+    cfg.put("stream-ffmpeg", stream_ffmpeg)
+    cfg.put("retry-unmatched", retry_unmatched)
 
 
 # Commands for downloading
@@ -81,9 +125,10 @@ def entrypoint(command: str, action: str, **kwargs):
     log.info(f"Current action: {action}\n")
 
     spotify_manager = SpotifyManager(cfg.get("spotify_client_id"), cfg.get("spotify_client_secret"))
-    tidal_manager = TidalManager()
-    jellyfin_manager = JellyfinManager(cfg.get("jellyfin_url"), cfg.get("jellyfin_api_key"))
     db = Database()
+    db.prune_tidal_tracks(cfg.get("tidal-cache-ttl") * 24 * 3600)
+    tidal_manager = TidalManager(db)
+    jellyfin_manager = JellyfinManager(cfg.get("jellyfin_url"), cfg.get("jellyfin_api_key"))
 
     # Ensure Spotify is connected
     spotify_manager.client.current_user()
@@ -95,123 +140,383 @@ def entrypoint(command: str, action: str, **kwargs):
     elif command == "helpers":
         handle_helpers(action, spotify_manager, tidal_manager, jellyfin_manager, db, **kwargs)
 
+    log.debug(f"Tidal rate limiter: {TIDAL_RATE_LIMITER.stats()}")
     log.info("Done!")
 
 
 def handle_download(action: str, spotify_manager: SpotifyManager, tidal_manager: TidalManager,
                     jellyfin_manager: JellyfinManager, db: Database, **kwargs):
-    """Handles the download process based on the action."""
-    spotify_tracks = get_spotify_tracks(action, spotify_manager, **kwargs)
-    tidal_tracks = match_spotify_with_tidal(spotify_tracks, tidal_manager, spotify_manager, jellyfin_manager, db)
-    download_tidal_tracks(tidal_tracks, tidal_manager)
+    """
+    Handles the download process based on the action.
+
+    The stages are chained through bounded queues: matching starts as soon as the first Spotify page is received and
+    downloads start as soon as the first track is matched.
+    """
+    checkpoints = {}
+    # IDs of the Spotify tracks behind each checkpoint (the playlists), to only save the fully handled ones
+    checkpoint_tracks = {}
+    # Spotify tracks not matched or whose download failed, and the matched ones by Tidal ID
+    unmatched_ids = set()
+    failed_tracks = []
+    matched_tracks = {}
+    outcomes_lock = threading.Lock()
+
+    def on_matched(spotify_track: SpotifyTrack, tidal_track: Optional[Track], outcome: str):
+        with outcomes_lock:
+            if outcome in ("unmatched", "skipped_unmatched"):
+                unmatched_ids.add(spotify_track.id)
+            elif tidal_track:
+                matched_tracks.setdefault(str(tidal_track.id), []).append(spotify_track)
+
+    def on_failed(tidal_track: Track):
+        with outcomes_lock:
+            failed_tracks.extend(matched_tracks.get(str(tidal_track.id), []))
+
+    with Progress(transient=True) as progress:
+        spotify_tracks = buffered(iter_spotify_tracks(action, spotify_manager, db, checkpoints, progress,
+                                                      checkpoint_tracks=checkpoint_tracks, **kwargs),
+                                  maxsize=SPOTIFY_PAGES_BUFFER)
+        tidal_tracks = buffered(match_spotify_with_tidal(spotify_tracks, tidal_manager, spotify_manager,
+                                                         jellyfin_manager, db, progress, on_matched=on_matched),
+                                maxsize=DOWNLOADS_BUFFER)
+        download_tidal_tracks(tidal_tracks, tidal_manager, db, progress, on_failed=on_failed)
+
+    # The liked songs watermark doesn't move past the failed downloads, so that the next run tries them again. The
+    # unmatched songs don't hold it back as they may never match (e.g. regional exclusives) and would pin it, a full
+    # scan searches them again once their retry delay is over (see Database.should_search_unmatched)
+    failed_added_at = [track.added_at for track in failed_tracks if track.added_at]
+    if "liked:download" in checkpoints and failed_added_at:
+        checkpoints["liked:download"] = min(failed_added_at)
+
+    # A playlist is only skipped by the next runs once all its tracks are matched and downloaded
+    unhandled_ids = unmatched_ids | {track.id for track in failed_tracks}
+    for state_key, track_ids in checkpoint_tracks.items():
+        if state_key in checkpoints and track_ids & unhandled_ids:
+            log.debug(f"Not all the tracks of {state_key} were handled, it will be processed again by the next run")
+            del checkpoints[state_key]
+
+    # Only saved once everything has been processed so an interrupted run is picked up again by the next one
+    db.put_states(checkpoints)
+
+
+def get_spotify_pages(action: str, spotify_manager: SpotifyManager, db: Database, checkpoints: dict,
+                      checkpoint_tracks: dict = None, **kwargs) -> Iterator[List[SpotifyTrack]]:
+    """
+    Retrieve Spotify tracks based on the action, page by page.
+
+    Only the liked songs added since the last run and the playlists that changed since the last run are retrieved
+    (unless a full scan is requested), the new watermark/snapshots are added to ``checkpoints`` and must be saved once
+    the tracks have been processed (the watermark is moved back to the oldest failed download, see
+    :func:`handle_download`).
+
+    :param checkpoint_tracks: Filled with the IDs of the tracks of each playlist checkpoint, which must not be saved if
+                              some of them were not handled
+    """
+    if checkpoint_tracks is None:
+        checkpoint_tracks = {}
+
+    if action == "liked":
+        watermark = None if cfg.get("full-scan") else db.get_state("liked:download")
+        for page in spotify_manager.iter_liked_songs(added_after=watermark):
+            # Songs come newest first, the first page holds the new watermark
+            if page and "liked:download" not in checkpoints:
+                checkpoints["liked:download"] = max(track.added_at or '' for track in page)
+            yield page
+    elif action == "playlist":
+        yield from spotify_manager.iter_playlist_tracks(kwargs["playlist_id"])
+    elif action == "file":
+        urls = file_to_list(kwargs["file_path"])
+        unchanged = 0
+        for url in urls:
+            playlist_id, snapshot_id = spotify_manager.get_playlist_snapshot(url)
+            state_key = f"playlist:download:{playlist_id}"
+            if not cfg.get("full-scan") and db.get_state(state_key) == snapshot_id:
+                unchanged += 1
+                continue
 
+            for page in spotify_manager.iter_playlist_tracks(playlist_id):
+                checkpoint_tracks.setdefault(state_key, set()).update(track.id for track in page)
+                yield page
+            checkpoints[state_key] = snapshot_id
 
-def get_spotify_tracks(action: str, spotify_manager: SpotifyManager, **kwargs) -> List[dict]:
-    """Retrieve Spotify tracks based on the action."""
+        if unchanged:
+            log.info(f"Skipped {unchanged}/{len(urls)} playlists that did not change since the last run.")
+    elif action == "track":
+        track = spotify_manager.get_track(kwargs["track_id"])
+        if track:
+            yield [track]
+
+
+def iter_spotify_tracks(action: str, spotify_manager: SpotifyManager, db: Database, checkpoints: dict,
+                        progress: Progress = None, checkpoint_tracks: dict = None,
+                        **kwargs) -> Iterator[List[SpotifyTrack]]:
+    """Retrieve Spotify tracks based on the action (see :func:`get_spotify_pages`), with their albums prefetched."""
     log.debug("Collecting Spotify tracks metadata...")
-    spotify_tracks = []
-
-    with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            transient=True,
-    ) as progress:
-        progress.add_task(description="Collecting Spotify tracks metadata...", total=None)
-
-        if action == "liked":
-            spotify_tracks = spotify_manager.get_liked_songs()
-        elif action == "playlist":
-            spotify_tracks = spotify_manager.get_playlist_tracks(kwargs["playlist_id"])
-        elif action == "file":
-            urls = file_to_list(kwargs["file_path"])
-            for url in urls:
-                spotify_tracks.extend(spotify_manager.get_playlist_tracks(url))
-        elif action == "track":
-            spotify_tracks.append(spotify_manager.get_track(kwargs["track_id"]))
-
-    log.info(f"Found {len(spotify_tracks)} Spotify tracks.\n")
-    return spotify_tracks
-
-
-def match_spotify_with_tidal(spotify_tracks: List[dict], tidal_manager: TidalManager, spotify_manager: SpotifyManager,
-                             jellyfin_manager: JellyfinManager, db: Database) -> List[Track]:
-    """Match Spotify tracks with Tidal tracks."""
-    tidal_tracks_to_download = []
-    already_on_jellyfin = 0
+    if progress:
+        task = progress.add_task(description="Collecting Spotify tracks metadata...", total=None)
+
+    found = 0
+    for spotify_tracks in get_spotify_pages(action, spotify_manager, db, checkpoints, checkpoint_tracks, **kwargs):
+        prefetch_spotify_albums(spotify_tracks, spotify_manager, db)
+        found += len(spotify_tracks)
+        yield spotify_tracks
+
+    if progress:
+        progress.remove_task(task)
+    log.info(f"Found {found} Spotify tracks.\n")
+
+
+def prefetch_spotify_albums(spotify_tracks: List[SpotifyTrack], spotify_manager: SpotifyManager, db: Database):
+    """
+    Add the album UPC to the tracks that still need to be matched, using batched requests for all the distinct albums
+    instead of one request per track.
+    """
+    tracks_to_match = [track for track in spotify_tracks
+                       if track.album_id and track.album_upc is None and not db.get(track.id)]
+    if not tracks_to_match:
+        return
+
+    log.debug("Prefetching Spotify albums metadata...")
+    albums = spotify_manager.get_albums([track.album_id for track in tracks_to_match])
+    for track in tracks_to_match:
+        if track.album_id in albums:
+            track.album_upc = (albums[track.album_id].get('external_ids') or {}).get('upc', '')
+
+
+def match_spotify_with_tidal(spotify_pages: Iterable[List[SpotifyTrack]], tidal_manager: TidalManager,
+                             spotify_manager: SpotifyManager, jellyfin_manager: JellyfinManager, db: Database,
+                             progress: Progress = None,
+                             on_matched: Callable[[SpotifyTrack, Track, str], None] = None) -> Iterator[Track]:
+    """
+    Match Spotify tracks with Tidal tracks, yielding the Tidal tracks to download as soon as they are matched.
+
+    Tracks are matched concurrently (up to the ``match-workers`` setting), the tracks of a page coming from the same
+    album being matched together (see :func:`match_spotify_tracks`).
+
+    :param on_matched: Called (from the matching threads) with each Spotify track, its Tidal track and the outcome
+    """
+    stats = Counter()
+    stats_lock = threading.Lock()
 
     log.debug("Matching Spotify tracks with Tidal...")
-    for track in rich.progress.track(spotify_tracks, description="Matching tracks...", transient=True):
-        if not track:
-            continue
-        if 'track' in track:
-            track = track['track']
-            if not track:  # fix strange crash when track is None
-                continue
-        if not 'id' in track:
-            continue
-
-        tidal_track_from_db = db.get_tidal_track_from_database(track['id'], tidal_manager)
-        if tidal_track_from_db:
-            if not cfg.get("ignore-jellyfin") and jellyfin_manager.does_track_exist(tidal_track_from_db or track):
-                log.debug(f"Track {track['name']} already exists in Jellyfin")
-                already_on_jellyfin += 1
-                continue
+    if progress:
+        task = progress.add_task("Matching tracks...", total=0)
+
+    def iter_groups() -> Iterator[List[SpotifyTrack]]:
+        for spotify_tracks in spotify_pages:
+            with stats_lock:
+                stats["total"] += len(spotify_tracks)
+            if progress:
+                progress.update(task, total=stats["total"])
+
+            if cfg.get("group-albums"):
+                groups = {}
+                for track in spotify_tracks:
+                    groups.setdefault(track.album_upc or track.album_id or track.id, []).append(track)
+                yield from groups.values()
             else:
-                log.debug(f"Track {track['name']} is not on Jellyfin but is in the database")
-                tidal_tracks_to_download.append(tidal_track_from_db)
-                continue
-
-        # Add metadata and find track on Tidal
-        track['album'] = spotify_manager.get_album(track['album']['id'])
-        tidal_track = tidal_manager.search_spotify_track(track, cfg.get('quality'))
+                yield from ([track] for track in spotify_tracks)
+
+    def match_group(tracks: List[SpotifyTrack]) -> List[Track]:
+        results = match_spotify_tracks(tracks, tidal_manager, spotify_manager, jellyfin_manager, db)
+        if on_matched:
+            for track, (tidal_track, outcome) in zip(tracks, results):
+                on_matched(track, tidal_track, outcome)
+        with stats_lock:
+            stats.update(outcome for _, outcome in results)
+        if progress:
+            progress.advance(task, advance=len(tracks))
+        return [tidal_track for tidal_track, _ in results if tidal_track]
+
+    for tidal_tracks in unordered_map(match_group, iter_groups(), max_workers=cfg.get("match-workers")):
+        yield from tidal_tracks
+
+    if progress:
+        progress.remove_task(task)
+    log.info(f"Matched {stats['matched']}/{stats['total'] - stats['on_jellyfin']} Spotify tracks with Tidal.")
+    if stats["skipped_unmatched"]:
+        log.info(f"Skipped {stats['skipped_unmatched']} tracks that could not be matched recently "
+                 f"(use --retry-unmatched to search them again).")
+
+
+def match_spotify_tracks(tracks: List[SpotifyTrack], tidal_manager: TidalManager, spotify_manager: SpotifyManager,
+                         jellyfin_manager: JellyfinManager, db: Database) -> List[tuple[Optional[Track], str]]:
+    """
+    Match Spotify tracks with Tidal tracks.
+
+    When multiple tracks come from the same album, the Tidal album is resolved once for all of them and only the
+    leftovers are searched track by track.
+
+    :return: For each track (in the same order), the Tidal track to download (None if there is nothing to download) and
+             the outcome ("matched", "on_jellyfin", "unmatched" or "skipped_unmatched" when a previous search failed
+             recently)
+    """
+    results: List[Optional[tuple[Optional[Track], str]]] = [None] * len(tracks)
+    tracks_to_search = []
+    search_indexes = []
+
+    for index, track in enumerate(tracks):
+        tidal_track_from_db = db.get_tidal_track_from_database(track.id, tidal_manager)
+        if not tidal_track_from_db:
+            if cfg.get("retry-unmatched") or db.should_search_unmatched(track.id):
+                tracks_to_search.append(track)
+                search_indexes.append(index)
+            else:
+                log.debug(f"Track {track.name} could not be matched recently, skipping")
+                results[index] = (None, "skipped_unmatched")
+        elif not cfg.get("ignore-jellyfin") and jellyfin_manager.does_track_exist(tidal_track_from_db or track):
+            log.debug(f"Track {track.name} already exists in Jellyfin")
+            results[index] = (None, "on_jellyfin")
+        else:
+            log.debug(f"Track {track.name} is not on Jellyfin but is in the database")
+            results[index] = (tidal_track_from_db, "matched")
+
+    # Add metadata (if it was not prefetched) and find tracks on Tidal
+    for track in tracks_to_search:
+        if track.album_upc is None and track.album_id:
+            track.album_upc = (spotify_manager.get_album(track.album_id).get('external_ids') or {}).get('upc', '')
+
+    album_matches = {}
+    if len(tracks_to_search) > 1:
+        album_matches = tidal_manager.match_album_tracks(tracks_to_search, cfg.get('quality'))
+
+    for index, track in zip(search_indexes, tracks_to_search):
+        # A candidate of the album in the wanted quality is definitive, otherwise the album isn't searched again
+        tidal_track = album_matches.get(track.id)
+        if not tidal_track or tidal_track.real_quality_score != cfg.get('quality'):
+            album_searched = len(tracks_to_search) > 1 and track.album_upc == tracks_to_search[0].album_upc
+            tidal_track = tidal_manager.search_spotify_track(track, cfg.get('quality'), album_searched=album_searched,
+                                                             album_candidate=tidal_track)
 
         if tidal_track:
             log_track_match(track, tidal_track)
-            tidal_tracks_to_download.append(tidal_track)
-            db.put(track['id'], tidal_track.id)
+            db.put(track.id, tidal_track.id)
+            db.put_tidal_track(tidal_track)
+            db.remove_unmatched(track.id)
+            results[index] = (tidal_track, "matched")
         else:
-            log.warning(
-                f"Could not find a match for {track['name']} - {track['artists'][0]['name']} - {track['album']['name']}")
-            continue
+            log.warning(f"Could not find a match for {track.name} - {track.artist} - {track.album_name}")
+            db.put_unmatched(track.id)
+            results[index] = (None, "unmatched")
 
-    log.info(
-        f"Matched {len(tidal_tracks_to_download)}/{len(spotify_tracks) - already_on_jellyfin} Spotify tracks with Tidal.")
-    return tidal_tracks_to_download
+    return results
 
 
-def log_track_match(spotify_track: dict, tidal_track: Track):
+def log_track_match(spotify_track: SpotifyTrack, tidal_track: Track):
     """Logs track matching information."""
     log.info("[bold]Found a match:", extra={"markup": True})
-    log.info(
-        f"[green]Spotify: {spotify_track['name']} - {spotify_track['artists'][0]['name']} - {spotify_track['album']['name']}",
-        extra={"markup": True})
+    log.info(f"[green]Spotify: {spotify_track.name} - {spotify_track.artist} - {spotify_track.album_name}",
+             extra={"markup": True})
     log.info(
         f"[blue]Tidal: {tidal_track.full_name} - {tidal_track.artist.name} - {tidal_track.album.name} ({tidal_track.real_quality} - {tidal_track.id})\n",
         extra={"markup": True})
 
 
-def download_tidal_tracks(tidal_tracks: List[Track], tidal_manager: TidalManager):
-    """Download matched Tidal tracks."""
-    if not tidal_tracks:
-        log.info("No tracks to download.")
-        return
+def download_tidal_tracks(tidal_tracks: Iterable[Track], tidal_manager: TidalManager, db: Database,
+                          progress: Progress, on_failed: Callable[[Track], None] = None):
+    """
+    Download matched Tidal tracks as soon as they are received.
+
+    Downloading (network) and finalizing (conversion, tags, move) are run by separate pools, the downloaded tracks
+    waiting in a bounded queue to be finalized, so that neither blocks the other. The tracks already in the library
+    (see :class:`LibraryIndex`) are skipped before any network call.
+
+    :param on_failed: Called with each Tidal track whose download or finalization failed
+    """
+    task = progress.add_task(f"Total progress", total=0)
+    count = 0
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+    seen = set()
+    # Bounds the downloaded tracks waiting to be finalized, downloads wait when it is full
+    finalize_slots = threading.Semaphore(cfg.get("finalize-workers") * 2)
+
+    library = LibraryIndex(cfg.get("out-dir"), db)
+    library.refresh(full=cfg.get("full-scan"))
+
+    def add_outcome(outcome: str):
+        with outcomes_lock:
+            outcomes[outcome] += 1
+        progress.advance(task)
+
+    def on_done(track: Track, future: Future):
+        if future.exception():
+            log.error(f"Error downloading track: {future.exception()}")
+            add_outcome("failed")
+            if on_failed:
+                on_failed(track)
+
+    def on_finalized(track: Track, future: Future):
+        finalize_slots.release()
+        if future.exception():
+            log.error(f"Error finalizing track: {future.exception()}")
+            scheduler.record_error()
+            add_outcome("failed")
+            if on_failed:
+                on_failed(track)
+        else:
+            add_outcome("downloaded")
+
+    with (ThreadPoolExecutor(max_workers=cfg.get("finalize-workers"), thread_name_prefix="finalize") as finalizer,
+          DownloadScheduler(cfg.get("download-workers"), adaptive=cfg.get("adaptive-downloads")) as scheduler):
+        def download(track: Track) -> int:
+            # The finalize slot is taken before the download starts, so waiting for it isn't measured as download time
+            try:
+                downloaded = tidal_manager.fetch_track(track, progress)
+                if not downloaded:
+                    finalize_slots.release()
+                    add_outcome("skipped")
+                    return 0
+
+                def finalize():
+                    tidal_manager.finalize_track(downloaded, progress)
+                    library.add(downloaded.final_path, track.id, track.isrc)
+
+                finalizer.submit(finalize).add_done_callback(functools.partial(on_finalized, track))
+            except BaseException:
+                finalize_slots.release()
+                raise
+            return downloaded.downloaded_bytes
+
+        # Tracks only leave the (bounded) queue of the previous stage when a download (and its finalization) can start
+        for track in tidal_tracks:
+            count += 1
+            progress.update(task, total=count)
+
+            # Tracks already in the library (or downloaded by this run) are skipped before any network call
+            if track.id in seen or library.contains(tidal_manager.get_track_path(track), track.id, track.isrc):
+                add_outcome("skipped")
+                continue
 
-    files_before_download = len(list(cfg.get("out-dir").rglob("*/*/*")))
+            seen.add(track.id)
+            finalize_slots.acquire()
+            try:
+                future = scheduler.submit(download, track)
+            except BaseException:
+                finalize_slots.release()
+                raise
+            future.add_done_callback(functools.partial(on_done, track))
 
-    with Progress(transient=True) as progress:
-        progress.add_task(f"Total progress", total=len(tidal_tracks))
+    progress.remove_task(task)
 
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(tidal_manager.download_track, track, progress) for track in tidal_tracks]
+    stats = scheduler.stats()
+    if stats["downloaded_bytes"]:
+        log.info(f"Downloaded {stats['downloaded_bytes'] / 1024 ** 2:.1f} MB at {stats['mb_per_s']} MB/s "
+                 f"({stats['workers']} concurrent downloads).")
 
-    files_after_download = len(list(cfg.get("out-dir").rglob("*/*/*")))
+    if outcomes["skipped"]:
+        log.info(f"Skipped {outcomes['skipped']} tracks already in the library.")
 
-    if files_after_download - files_before_download == len(tidal_tracks) - cfg.get("already-downloaded", 0):
-        log.info(f"[bold green]Downloaded {len(tidal_tracks)} tracks from Tidal.", extra={"markup": True})
+    if not count:
+        log.info("No tracks to download.")
+        return
+
+    if not outcomes["failed"]:
+        log.info(f"[bold green]Downloaded {outcomes['downloaded']} tracks from Tidal.", extra={"markup": True})
     else:
         log.warning(
-            f"[bold yellow]Some tracks might not have been downloaded correctly. Check the logs for more information.",
-            extra={"markup": True})
+            f"[bold yellow]{outcomes['failed']} tracks could not be downloaded correctly. Check the logs for more "
+            f"information.", extra={"markup": True})
 
 
 def handle_jellyfin(action: str, spotify_manager: SpotifyManager, tidal_manager: TidalManager,
@@ -245,20 +550,65 @@ def sync_jellyfin_playlist(spotify_manager: SpotifyManager, jellyfin_manager: Je
     """Syncs Spotify playlists with Jellyfin."""
     source = kwargs["source"]
     if source == "liked":
-        tracks = spotify_manager.get_liked_songs()
+        sync_jellyfin_liked_songs(spotify_manager, jellyfin_manager, tidal_manager, db, kwargs.get("playlist_user"))
+        return
     elif source == "playlist":
         tracks = spotify_manager.get_playlist_with_tracks(kwargs["playlist_id"])
     elif source == "file":
+        user = kwargs.get("playlist_user")
         playlist_ids = file_to_list(kwargs["file_path"])
         for playlist_id in playlist_ids:
+            playlist_id, snapshot_id = spotify_manager.get_playlist_snapshot(playlist_id)
+            state_key = f"playlist:jellyfin:{user}:{playlist_id}"
+            if not cfg.get("full-scan") and db.get_state(state_key) == snapshot_id:
+                log.info(f"Playlist {playlist_id} did not change since the last sync.")
+                continue
+
             tracks = spotify_manager.get_playlist_with_tracks(playlist_id)
-            jellyfin_manager.sync_playlist(playlist_with_tracks=tracks, user=kwargs.get("playlist_user"),
-                                           tidal_manager=tidal_manager, database=db)
+            if jellyfin_manager.sync_playlist(playlist_with_tracks=tracks, user=user,
+                                              tidal_manager=tidal_manager, database=db):
+                db.put_state(state_key, snapshot_id)
+        return
 
     jellyfin_manager.sync_playlist(playlist_with_tracks=tracks, user=kwargs.get("playlist_user"),
                                    tidal_manager=tidal_manager, database=db)
 
 
+def sync_jellyfin_liked_songs(spotify_manager: SpotifyManager, jellyfin_manager: JellyfinManager,
+                              tidal_manager: TidalManager, db: Database, user: str):
+    """
+    Syncs Spotify liked songs with Jellyfin.
+
+    Nothing is done if the liked songs did not change since the last sync, and only the new songs are added (at the
+    top of the playlist) if no song was removed in the meantime.
+    """
+    state_key = f"liked:jellyfin:{user}"
+    previous_state = None if cfg.get("full-scan") else db.get_state(state_key)
+    state = spotify_manager.get_liked_songs_state()
+
+    if state == previous_state:
+        log.info("Liked songs did not change since the last sync.")
+        return
+
+    tracks = None
+    append = False
+    if previous_state:
+        previous_total, previous_added_at = previous_state.split("|", maxsplit=1)
+        # The songs sharing the timestamp of the previous state were already synced
+        new_tracks = [track for track in spotify_manager.get_liked_songs(added_after=previous_added_at)
+                      if (track.added_at or '') > previous_added_at]
+        append = int(previous_total) + len(new_tracks) == int(state.split("|", maxsplit=1)[0])
+        if append:
+            tracks = new_tracks
+
+    if tracks is None:
+        tracks = spotify_manager.get_liked_songs()
+
+    if jellyfin_manager.sync_playlist(playlist_with_tracks=tracks, user=user, tidal_manager=tidal_manager,
+                                      database=db, append=append):
+        db.put_state(state_key, state)
+
+
 def handle_helpers(action: str, spotify_manager: SpotifyManager, tidal_manager: TidalManager,
                    jellyfin_manager: JellyfinManager, db: Database, **kwargs):
     """Handles helper commands."""
@@ -1,19 +1,27 @@
+import json
 import sqlite3
+import threading
+import time
 from pathlib import Path
 from typing import Optional
 
 from tidalapi import Track
 
 from spotidalyfin import cfg
-from spotidalyfin.managers.tidal_manager import TidalManager
+from spotidalyfin.managers.tidal_manager import TidalManager, track_to_json
 from spotidalyfin.utils.logger import log
 
+# Delays (in seconds) before searching again a track that could not be matched, by number of failed attempts
+UNMATCHED_RETRY_DELAYS = (24 * 3600, 7 * 24 * 3600, 30 * 24 * 3600)
+
 
 class Database:
     def __init__(self, db_path: Path = cfg.get("config-dir") / "spotidalyfin.db"):
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.con = sqlite3.connect(self.db_path)
+        # The connection is shared by the threads of the pipeline, the lock serializes its use
+        self.con = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.RLock()
         self.initialize_database()
 
     def __enter__(self):
@@ -29,40 +37,318 @@ class Database:
                 tidal_id TEXT
             )
         """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS tidal_tracks (
+                tidal_id TEXT PRIMARY KEY,
+                data TEXT,
+                fetched_at REAL
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS audio_resolutions (
+                tidal_id TEXT PRIMARY KEY,
+                audio_quality TEXT,
+                bit_depth INTEGER,
+                sample_rate INTEGER,
+                fetched_at REAL
+            )
+        """)
+        # Added after the table was created
+        columns = {row[1] for row in self.con.execute("PRAGMA table_info(audio_resolutions)").fetchall()}
+        if "fetched_at" not in columns:
+            self.con.execute("ALTER TABLE audio_resolutions ADD COLUMN fetched_at REAL")
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS unmatched (
+                spotify_id TEXT PRIMARY KEY,
+                attempts INTEGER,
+                last_attempt REAL
+            )
+        """)
+        # Keys (ISRC, UPC and normalized tokens) of the Tidal tracks cached in tidal_tracks, to search them locally
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_keys (
+                key TEXT,
+                tidal_id TEXT,
+                PRIMARY KEY (key, tidal_id)
+            )
+        """)
+        # Index of the output library (see LibraryIndex)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS library_dirs (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                mtime REAL
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS library_files (
+                path TEXT PRIMARY KEY,
+                directory TEXT,
+                mtime REAL,
+                size INTEGER,
+                tidal_id TEXT,
+                isrc TEXT
+            )
+        """)
         self.con.commit()
 
     def put(self, spotify_id: str, tidal_id: str):
-        try:
-            self.con.execute("INSERT INTO matches(spotify_id, tidal_id) VALUES (?, ?)", (spotify_id, tidal_id))
-            self.con.commit()
-        except sqlite3.IntegrityError:
-            # Already exists
-            self.remove(spotify_id)
-            self.put(spotify_id, tidal_id)
+        with self.lock:
+            try:
+                self.con.execute("INSERT INTO matches(spotify_id, tidal_id) VALUES (?, ?)", (spotify_id, tidal_id))
+                self.con.commit()
+            except sqlite3.IntegrityError:
+                # Already exists
+                self.remove(spotify_id)
+                self.put(spotify_id, tidal_id)
 
     def put_many(self, matches: list[tuple[str, str]]):
-        try:
-            self.con.executemany("INSERT INTO matches(spotify_id, tidal_id) VALUES (?, ?)", matches)
-            self.con.commit()
-        except sqlite3.IntegrityError as e:
-            log.error(f"Error: {e}")
+        with self.lock:
+            try:
+                self.con.executemany("INSERT INTO matches(spotify_id, tidal_id) VALUES (?, ?)", matches)
+                self.con.commit()
+            except sqlite3.IntegrityError as e:
+                log.error(f"Error: {e}")
 
     def get(self, spotify_id: str) -> str:
-        cursor = self.con.execute("SELECT tidal_id FROM matches WHERE spotify_id = ?", (spotify_id,))
-        match = cursor.fetchone()
+        with self.lock:
+            cursor = self.con.execute("SELECT tidal_id FROM matches WHERE spotify_id = ?", (spotify_id,))
+            match = cursor.fetchone()
         return match[0] if match else None
 
     def remove(self, spotify_id: str):
-        try:
-            self.con.execute("DELETE FROM matches WHERE spotify_id = ?", (spotify_id,))
+        with self.lock:
+            try:
+                self.con.execute("DELETE FROM matches WHERE spotify_id = ?", (spotify_id,))
+                self.con.commit()
+            except sqlite3.IntegrityError as e:
+                log.error(f"Error: {e}")
+
+    def get_state(self, key: str) -> Optional[str]:
+        """Get a sync state value (e.g. a watermark saved by a previous run)."""
+        with self.lock:
+            cursor = self.con.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+            state = cursor.fetchone()
+        return state[0] if state else None
+
+    def put_state(self, key: str, value: str):
+        """Save a sync state value, replacing the previous one."""
+        self.put_states({key: value})
+
+    def put_states(self, states: dict[str, str]):
+        """Save multiple sync state values at once, replacing the previous ones."""
+        with self.lock:
+            self.con.executemany("INSERT OR REPLACE INTO sync_state(key, value) VALUES (?, ?)", states.items())
+            self.con.commit()
+
+    def get_tidal_track_data(self, tidal_id: str, max_age: float = None) -> Optional[dict]:
+        """
+        Get the cached metadata of a Tidal track (see :func:`track_to_json`).
+
+        :param tidal_id: ID of the Tidal track
+        :param max_age: Maximum age of the cached metadata in seconds (None: no limit)
+        :return: Metadata of the track, None if it is not cached or too old :class:`dict`
+        """
+        with self.lock:
+            cursor = self.con.execute("SELECT data, fetched_at FROM tidal_tracks WHERE tidal_id = ?", (str(tidal_id),))
+            row = cursor.fetchone()
+        if not row or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return json.loads(row[0])
+
+    def put_tidal_track(self, track: Track):
+        """Cache the metadata of a Tidal track, replacing the previous one."""
+        with self.lock:
+            self.con.execute("INSERT OR REPLACE INTO tidal_tracks(tidal_id, data, fetched_at) VALUES (?, ?, ?)",
+                             (str(track.id), json.dumps(track_to_json(track)), time.time()))
+            self.con.commit()
+
+    def put_unmatched(self, spotify_id: str):
+        """Record a failed attempt to match a Spotify track."""
+        with self.lock:
+            self.con.execute("""
+                INSERT INTO unmatched(spotify_id, attempts, last_attempt) VALUES (?, 1, ?)
+                ON CONFLICT(spotify_id) DO UPDATE SET attempts = attempts + 1, last_attempt = excluded.last_attempt
+            """, (spotify_id, time.time()))
+            self.con.commit()
+
+    def remove_unmatched(self, spotify_id: str):
+        """Forget the failed attempts to match a Spotify track (e.g. once it is matched)."""
+        with self.lock:
+            self.con.execute("DELETE FROM unmatched WHERE spotify_id = ?", (spotify_id,))
+            self.con.commit()
+
+    def should_search_unmatched(self, spotify_id: str) -> bool:
+        """
+        Check if a Spotify track has to be searched on Tidal, given its previous failed attempts.
+
+        After a failed attempt, the track is only searched again once the delay matching its number of attempts is
+        over (see ``UNMATCHED_RETRY_DELAYS``, the last one being used for all the next attempts).
+        """
+        with self.lock:
+            cursor = self.con.execute("SELECT attempts, last_attempt FROM unmatched WHERE spotify_id = ?",
+                                      (spotify_id,))
+            unmatched = cursor.fetchone()
+        if not unmatched:
+            return True
+
+        attempts, last_attempt = unmatched
+        delay = UNMATCHED_RETRY_DELAYS[min(attempts, len(UNMATCHED_RETRY_DELAYS)) - 1]
+        return time.time() - last_attempt >= delay
+
+    def get_audio_resolution(self, tidal_id: str, audio_quality: str = None,
+                             max_age: float = None) -> Optional[tuple[int, int]]:
+        """
+        Get the audio resolution (bit depth, sample rate) probed for a Tidal track.
+
+        :param tidal_id: ID of the Tidal track
+        :param audio_quality: Current audio quality of the track, the resolution is ignored if it was probed for another
+                              one (e.g. the track was remastered since)
+        :param max_age: Maximum age of the resolution in seconds (None: no limit)
+        :return: Bit depth and sample rate, None if never probed, probed for another quality or too old
+        """
+        with self.lock:
+            cursor = self.con.execute("""
+                SELECT audio_quality, bit_depth, sample_rate, fetched_at FROM audio_resolutions WHERE tidal_id = ?
+            """, (str(tidal_id),))
+            row = cursor.fetchone()
+        if not row or (audio_quality is not None and row[0] != audio_quality):
+            return None
+        if max_age is not None and (row[3] is None or time.time() - row[3] > max_age):
+            return None
+        return row[1], row[2]
+
+    def put_audio_resolution(self, tidal_id: str, audio_quality: str, bit_depth: int, sample_rate: int):
+        """Save the audio quality and resolution of a Tidal track, replacing the previous one."""
+        with self.lock:
+            self.con.execute("""
+                INSERT OR REPLACE INTO audio_resolutions(tidal_id, audio_quality, bit_depth, sample_rate, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (str(tidal_id), audio_quality, bit_depth, sample_rate, time.time()))
+            self.con.commit()
+
+    def put_catalog_tracks(self, tracks: list[tuple[Track, list[str]]]):
+        """
+        Add Tidal tracks to the local catalog: their metadata is cached (see :func:`put_tidal_track`) and they can
+        then be found by :func:`search_catalog` with the given keys.
+
+        :param tracks: Tidal tracks with their keys :class:`list[tuple[Track, list[str]]]`
+        """
+        fetched_at = time.time()
+        with self.lock:
+            self.con.executemany("INSERT OR REPLACE INTO tidal_tracks(tidal_id, data, fetched_at) VALUES (?, ?, ?)",
+                                 [(str(track.id), json.dumps(track_to_json(track)), fetched_at)
+                                  for track, _ in tracks])
+            # The keys of a re-indexed track replace the previous ones (e.g. renamed track)
+            self.con.executemany("DELETE FROM catalog_keys WHERE tidal_id = ?",
+                                 [(str(track.id),) for track, _ in tracks])
+            self.con.executemany("INSERT OR IGNORE INTO catalog_keys(key, tidal_id) VALUES (?, ?)",
+                                 [(key, str(track.id)) for track, keys in tracks for key in keys])
+            self.con.commit()
+
+    def search_catalog(self, keys: list[str], max_age: float = None, limit: int = 10) -> list[dict]:
+        """
+        Search the local catalog for the Tidal tracks sharing the most keys with the given ones.
+
+        The keys are weighted by type: a shared ISRC outweighs any number of shared UPCs and tokens, a shared UPC any
+        number of shared tokens.
+
+        :param keys: Keys to look for (see :func:`put_catalog_tracks`)
+        :param max_age: Maximum age of the cached metadata in seconds (None: no limit)
+        :param limit: Maximum number of tracks returned
+        :return: Metadata of the tracks found (see :func:`track_to_json`), best matches first :class:`list[dict]`
+        """
+        if not keys:
+            return []
+
+        min_fetched_at = time.time() - max_age if max_age is not None else 0
+        with self.lock:
+            cursor = self.con.execute(f"""
+                SELECT tidal_tracks.data FROM catalog_keys
+                JOIN tidal_tracks ON tidal_tracks.tidal_id = catalog_keys.tidal_id
+                WHERE catalog_keys.key IN ({", ".join("?" * len(keys))}) AND tidal_tracks.fetched_at >= ?
+                GROUP BY catalog_keys.tidal_id
+                ORDER BY SUM(CASE WHEN catalog_keys.key LIKE 'isrc:%' THEN 10000
+                                  WHEN catalog_keys.key LIKE 'upc:%' THEN 100 ELSE 1 END) DESC
+                LIMIT ?
+            """, (*keys, min_fetched_at, limit))
+            rows = cursor.fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def prune_tidal_tracks(self, max_age: float):
+        """
+        Remove the cached Tidal tracks older than the given age, with their keys in the local catalog.
+
+        :param max_age: Maximum age of the cached metadata in seconds
+        """
+        min_fetched_at = time.time() - max_age
+        with self.lock:
+            self.con.execute("""
+                DELETE FROM catalog_keys
+                WHERE tidal_id IN (SELECT tidal_id FROM tidal_tracks WHERE fetched_at < ?)
+                   OR tidal_id NOT IN (SELECT tidal_id FROM tidal_tracks)
+            """, (min_fetched_at,))
+            self.con.execute("DELETE FROM tidal_tracks WHERE fetched_at < ?", (min_fetched_at,))
+            self.con.commit()
+
+    def get_library_dirs(self) -> dict[str, tuple[str, float]]:
+        """Get the directories of the library index, with their parent and modification time."""
+        with self.lock:
+            cursor = self.con.execute("SELECT path, parent, mtime FROM library_dirs")
+            return {path: (parent, mtime) for path, parent, mtime in cursor.fetchall()}
+
+    def get_library_files(self) -> dict[str, tuple[str, float, int, str, str]]:
+        """Get the files of the library index, with their directory, modification time, size, Tidal ID and ISRC."""
+        with self.lock:
+            cursor = self.con.execute("SELECT path, directory, mtime, size, tidal_id, isrc FROM library_files")
+            return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def update_library(self, dirs: list[tuple[str, str, float]] = (),
+                       files: list[tuple[str, str, float, int, str, str]] = (), removed_dirs: list[str] = (),
+                       removed_files: list[str] = ()):
+        """
+        Update the library index at once.
+
+        :param dirs: Directories added or updated (path, parent, modification time)
+        :param files: Files added or updated (path, directory, modification time, size, Tidal ID, ISRC)
+        :param removed_dirs: Directories removed (their files are removed too)
+        :param removed_files: Files removed
+        """
+        with self.lock:
+            self.con.executemany("DELETE FROM library_dirs WHERE path = ?", [(path,) for path in removed_dirs])
+            self.con.executemany("DELETE FROM library_files WHERE directory = ?", [(path,) for path in removed_dirs])
+            self.con.executemany("DELETE FROM library_files WHERE path = ?", [(path,) for path in removed_files])
+            self.con.executemany("INSERT OR REPLACE INTO library_dirs(path, parent, mtime) VALUES (?, ?, ?)", dirs)
+            self.con.executemany("""
+                INSERT OR REPLACE INTO library_files(path, directory, mtime, size, tidal_id, isrc)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, files)
             self.con.commit()
-        except sqlite3.IntegrityError as e:
-            log.error(f"Error: {e}")
 
     def get_tidal_track_from_database(self, spotify_id: str, tidal_manager: TidalManager) -> Optional[Track]:
+        """
+        Get the Tidal track matched with a Spotify track.
+
+        The track is rebuilt from the cached metadata when it is fresh enough (``tidal-cache-ttl`` days), otherwise it
+        is fetched from Tidal and cached again.
+        """
         tidal_id = self.get(spotify_id)
         if tidal_id:
+            data = self.get_tidal_track_data(tidal_id, cfg.get("tidal-cache-ttl") * 24 * 3600)
+            if data:
+                try:
+                    return tidal_manager.parse_track(data)
+                except Exception as e:
+                    log.debug(f"Could not parse cached Tidal track {tidal_id}: {e}")
+
             track = tidal_manager.get_track(tidal_id)
             if track:
+                self.put_tidal_track(track)
                 return track
         return None
@@ -13,13 +13,14 @@ from tidalapi.exceptions import ObjectNotFound
 
 from spotidalyfin import cfg
 from spotidalyfin.db.database import Database
-from spotidalyfin.managers.spotify_manager import SpotifyManager
+from spotidalyfin.managers.spotify_manager import SpotifyManager, SpotifyTrack
 from spotidalyfin.managers.tidal_manager import TidalManager
 from spotidalyfin.utils.comparisons import weighted_word_overlap, close
 from spotidalyfin.utils.file_utils import resize_image, calculate_checksum, file_to_list, remove_line_from_file, \
     write_line_to_file, get_as_base64
 from spotidalyfin.utils.formatting import format_artists, normalize_str, remove_invalid_chars_from_str
 from spotidalyfin.utils.logger import log
+from spotidalyfin.utils.scheduler import DownloadScheduler
 
 LIBRARY_MAX_SIZE = (1920, 1080)
 PEOPLE_MAX_SIZE = (900, 900)
@@ -254,21 +255,21 @@ class JellyfinManager:
 
         return None
 
-    def does_track_exist(self, track: dict | Track) -> bool:
+    def does_track_exist(self, track: SpotifyTrack | Track) -> bool:
         """
         Check if a track exists in Jellyfin.
 
-        :param track: Spotify track dict or TidalAPI Track object :class:`tidalapi.Track` :class:`dict`
+        :param track: Spotify track or TidalAPI Track object :class:`tidalapi.Track` :class:`SpotifyTrack`
         :return: True if the track exists, otherwise False :class:`bool`
         """
         return bool(self.get_track_from_data(track))
 
-    def get_track_from_data(self, track: dict | Track) -> Optional[dict]:
+    def get_track_from_data(self, track: SpotifyTrack | Track) -> Optional[dict]:
         """
-        Get Jellyfin track from either a Spotify track dict or a TidalAPI Track object. Using the Tidal Track object
+        Get Jellyfin track from either a Spotify track or a TidalAPI Track object. Using the Tidal Track object
         is more preferable as it contains the same metadata as the files downloaded (with this tool).
 
-        :param track: Spotify track dict or TidalAPI Track object :class:`tidalapi.Track` :class:`dict`
+        :param track: Spotify track or TidalAPI Track object :class:`tidalapi.Track` :class:`SpotifyTrack`
         :return: A Jellyfin track dict if found, otherwise None
         """
         if isinstance(track, Track):
@@ -277,10 +278,10 @@ class JellyfinManager:
             album_name = track.album.name
             duration = track.duration
         else:
-            track_name = track.get('name', '')
-            artist_name = format_artists(track.get('artists', [{}]), lower=False)[0]
-            album_name = track.get('album', {}).get('name', '')
-            duration = track.get('duration_ms', 0) / 1000
+            track_name = track.name
+            artist_name = format_artists(track.artists or [""], lower=False)[0]
+            album_name = track.album_name
+            duration = track.duration
         # year = spotify_track.get('album', {}).get('release_date', '')[:4]
 
         # Search for album from artist and then track name in album
@@ -454,6 +455,26 @@ class JellyfinManager:
         """
         self.request(f"Playlists/{playlist_id}/Items", method="POST", params={"ids": track_id, "userId": user_id})
 
+    def get_playlist_items(self, playlist_id: str, user_id: str) -> List[dict]:
+        """
+        Get the entries of a playlist, in order (each with its ``PlaylistItemId``).
+
+        :param playlist_id: ID of the playlist :str
+        :param user_id: ID of the user :str
+        :return: Entries of the playlist :class:`list`
+        """
+        return self.request(f"Playlists/{playlist_id}/Items", params={"userId": user_id})
+
+    def move_playlist_item(self, playlist_id: str, playlist_item_id: str, index: int):
+        """
+        Move an entry of a playlist to a new position.
+
+        :param playlist_id: ID of the playlist :str
+        :param playlist_item_id: ID of the entry in the playlist (``PlaylistItemId``, not the track ID) :str
+        :param index: New position of the entry :int
+        """
+        self.request(f"Playlists/{playlist_id}/Items/{playlist_item_id}/Move/{index}", method="POST")
+
     def add_tracks_to_playlist(self, track_ids: List[str], playlist_id: str, user_id: str):
         """
         Add multiple tracks to a playlist in chunks of 15 (to not DDOS the server)
@@ -467,7 +488,7 @@ class JellyfinManager:
             self.add_track_to_playlist(",".join(batch), playlist_id, user_id)
 
     def sync_playlist(self, playlist_with_tracks: dict, user: str,
-                      tidal_manager: TidalManager = None, database: Database = None):
+                      tidal_manager: TidalManager = None, database: Database = None, append: bool = False) -> bool:
         """
         Syncs a playlist by creating it in the system and adding tracks to it.
 
@@ -476,14 +497,19 @@ class JellyfinManager:
         :param progress: Optional progress tracker :Progress
         :param tidal_manager: Optional Tidal manager for track retrieval :TidalManager
         :param database: Optional database for track lookup :Database
+        :param append: Add the tracks at the top of the existing playlist instead of recreating it (if it exists), the
+                       tracks already in the playlist are not added again :bool
+        :return: True if the playlist was synced with all its tracks, False if it could not be synced or if some tracks
+                 are not in Jellyfin yet (the sync has to be done again once they are) :bool
         """
         user_id = self.get_user_id_from_username(user)
 
         if not user_id:
             log.error(f"User '{user}' not found.")
-            return
+            return False
 
         tracks_id_to_add = []
+        missing = 0
 
         with Progress() as progress:
             # Liked Songs playlist (input is a list)
@@ -503,37 +529,50 @@ class JellyfinManager:
                     cover_url = playlist_with_tracks.get('images', [{}])[0].get('url', None)
 
             task = progress.add_task(f"Syncing playlist '{playlist_name}'...", total=1)
-            self.create_playlist(playlist_name, user_id, is_public, cover_url)
+            prepend = append and self.get_playlist_id_from_name(playlist_name, user_id) is not None
+            if not prepend:
+                self.create_playlist(playlist_name, user_id, is_public, cover_url)
 
             progress.update(task, description=f"Matching tracks for playlist '{playlist_name}'...", total=len(tracks))
 
             # Collect track IDs to add
-            for track in tracks:
-                track_data = track.get('track', track)
-                if not track_data:
-                    log.error(f"Track '{track}' not found.")
-                    continue
-
+            for track_data in tracks:
                 if tidal_manager and database:
-                    track_id = database.get(track_data.get('id'))
-                    if track_id:
-                        try:
-                            track_data = tidal_manager.get_track(track_id)
-                        except ObjectNotFound:
-                            log.debug(f"Track '{track_data.get('id')}' not found on Tidal, resorting to dict data.")
+                    try:
+                        track_data = database.get_tidal_track_from_database(track_data.id, tidal_manager) or track_data
+                    except ObjectNotFound:
+                        log.debug(f"Track '{track_data.id}' not found on Tidal, resorting to Spotify data.")
 
                 jellyfin_track = self.get_track_from_data(track_data)
                 if jellyfin_track:
                     tracks_id_to_add.append(jellyfin_track.get('Id', ''))
+                else:
+                    missing += 1
 
                 progress.advance(task, advance=1)
 
             # Add tracks to the playlist
-            if tracks_id_to_add and playlist_name:
+            playlist_id = self.get_playlist_id_from_name(playlist_name, user_id) if playlist_name else None
+            ordered_ids = tracks_id_to_add
+            if prepend and playlist_id:
+                # Tracks added by a previous sync (when some others were not in Jellyfin yet)
+                existing = {item.get('Id') for item in self.get_playlist_items(playlist_id, user_id)}
+                tracks_id_to_add = [track_id for track_id in tracks_id_to_add if track_id not in existing]
+
+            if tracks_id_to_add and playlist_id:
                 progress.update(task, description=f"Adding tracks to playlist '{playlist_name}'...")
-                playlist_id = self.get_playlist_id_from_name(playlist_name, user_id)
-                if playlist_id:
-                    self.add_tracks_to_playlist(tracks_id_to_add, playlist_id, user_id)
+                self.add_tracks_to_playlist(tracks_id_to_add, playlist_id, user_id)
+                if prepend:
+                    # Added at the end, moved to their position at the top (the tracks are newest first)
+                    items = self.get_playlist_items(playlist_id, user_id)[-len(tracks_id_to_add):]
+                    for track_id, item in zip(tracks_id_to_add, items):
+                        index = ordered_ids.index(track_id)
+                        self.move_playlist_item(playlist_id, item.get('PlaylistItemId', ''), index)
+
+        if missing:
+            log.info(f"{missing} tracks of playlist '{playlist_name}' are not in Jellyfin yet, "
+                     f"they will be added by the next sync.")
+        return not missing
 
     def download_artists_images(self, tidal_manager: TidalManager, spotify_manager: SpotifyManager = None):
         """
@@ -594,19 +633,21 @@ class JellyfinManager:
 
                     progress.advance(task, advance=1)
 
-    def download_track(self, track_id, file_path):
+    def download_track(self, track_id, file_path) -> int:
         """
         Download a track from Jellyfin to a file.
 
         :param track_id: ID of the track :str
         :param file_path: Path to save the track to :str
+        :return: Number of bytes downloaded :int
         """
         with self.request(f"Items/{track_id}/Download", method="DOWNLOAD_GET") as r:
             if file_path.exists():
-                return
+                return 0
 
             with open(file_path, "wb") as f:
                 shutil.copyfileobj(r.raw, f)
+            return file_path.stat().st_size
 
     def download_playlist_songs(self, playlist_name, directory):
         """
@@ -627,12 +668,14 @@ class JellyfinManager:
         with Progress(transient=True) as progress:
             task = progress.add_task(f"Total progress", total=len(tracks))
 
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                # TODO: fix progress bar going to 100% real quick (due to stream=True)
+            with DownloadScheduler(cfg.get("download-workers"), adaptive=cfg.get("adaptive-downloads")) as scheduler:
                 for track in tracks:
                     track_name = track.get('Name', '')
                     file_path = directory / "Playlists" / f"{playlist_name}" / f"{remove_invalid_chars_from_str(track_name)}.flac"
                     file_path.parent.mkdir(parents=True, exist_ok=True)
                     log.info(f"Downloading track '{track_name}' to {file_path}")
-                    executor.submit(self.download_track, track.get('Id', ''), file_path)
-                    progress.advance(task, advance=1)
+                    scheduler.submit(self.download_track, track.get('Id', ''), file_path).add_done_callback(
+                        lambda _: progress.advance(task, advance=1))
+
+            stats = scheduler.stats()
+            log.info(f"Downloaded {stats['downloaded_bytes'] / 1024 ** 2:.1f} MB at {stats['mb_per_s']} MB/s.")
@@ -1,6 +1,7 @@
 # spotify_manager.py
-import random
-import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
 
 import cachebox
 import spotipy
@@ -8,6 +9,65 @@ from spotipy import SpotifyOAuth, CacheFileHandler
 
 from spotidalyfin import cfg
 from spotidalyfin.utils.decorators import rate_limit
+from spotidalyfin.utils.pipeline import ordered_map
+
+PAGE_SIZE = 50
+ALBUMS_BATCH_SIZE = 20
+PLAYLIST_ITEMS_FIELDS = "items(added_at,track(id,name,duration_ms,external_ids(isrc),artists(name),album(id,name))),total"
+PLAYLIST_FIELDS = "id,name,owner(id,display_name),images,snapshot_id"
+
+
+@dataclass(slots=True)
+class SpotifyTrack:
+    """Slim Spotify track, holding only what is used for matching and syncing instead of the whole API payload."""
+    id: str
+    name: str
+    artists: tuple[str, ...]
+    album_id: str
+    album_name: str
+    album_upc: Optional[str] = None  # None until the full album has been fetched
+    isrc: str = ""
+    duration_ms: int = 0
+    added_at: Optional[str] = None
+
+    @property
+    def artist(self) -> str:
+        return self.artists[0] if self.artists else ""
+
+    @property
+    def duration(self) -> float:
+        """Duration of the track in seconds."""
+        return self.duration_ms / 1000
+
+    @classmethod
+    def from_item(cls, item: dict) -> Optional["SpotifyTrack"]:
+        """Create a track from a Spotify track or playlist/saved track item, None if it is not a valid track."""
+        if not item:
+            return None
+
+        added_at = item.get('added_at')
+        if 'track' in item:
+            item = item['track']
+        if not item or not item.get('id'):  # fix strange crash when track is None (and skips local files)
+            return None
+
+        album = item.get('album') or {}
+        return cls(
+            id=item['id'],
+            name=item.get('name') or '',
+            artists=tuple(artist.get('name') or '' for artist in item.get('artists') or [] if artist),
+            album_id=album.get('id') or '',
+            album_name=album.get('name') or '',
+            album_upc=(album['external_ids'] or {}).get('upc', '') if 'external_ids' in album else None,
+            isrc=((item.get('external_ids') or {}).get('isrc') or '').upper(),
+            duration_ms=item.get('duration_ms') or 0,
+            added_at=added_at
+        )
+
+    @classmethod
+    def from_items(cls, items: list[dict]) -> list["SpotifyTrack"]:
+        """Create the tracks from a list of Spotify items, invalid items are skipped."""
+        return [track for track in map(cls.from_item, items) if track]
 
 
 class SpotifyManager:
@@ -22,30 +82,75 @@ class SpotifyManager:
                                                                 cache_handler=CacheFileHandler(token_file),
                                                                 open_browser=False))
 
-    @cachebox.cached(cachebox.LRUCache(maxsize=128))
     @rate_limit
-    def get_playlist_tracks(self, playlist_id: str):
-        tracks = []
-        results = self.client.playlist_items(playlist_id, limit=50, additional_types='track')
-        tracks.extend(results.get('items'))
-
-        while results.get('next'):
-            time.sleep(random.uniform(0.1, 0.3))
-            results = self.client.playlist_items(playlist_id, limit=50, offset=len(tracks), additional_types='track')
-            tracks.extend(results.get('items'))
+    def get_page(self, fetch_page: Callable[..., dict], offset: int, limit: int = PAGE_SIZE) -> dict:
+        """Get a single page of a paginated endpoint (retried when rate limited)."""
+        return fetch_page(limit=limit, offset=offset) or {}
+
+    def iter_pages(self, fetch_page: Callable[..., dict], limit: int = PAGE_SIZE) -> Iterator[list]:
+        """
+        Iterate over the items of a paginated endpoint, page by page and in their original order.
+
+        The first page is fetched alone to read the ``total`` of items, the remaining offsets are then fetched
+        concurrently (up to the ``spotify-workers`` setting).
+
+        :param fetch_page: Function fetching one page, called with ``limit`` and ``offset`` keyword arguments
+        :param limit: Number of items per page
+        :return: Iterator over the items of each page :class:`Iterator[list]`
+        """
+        first_page = self.get_page(fetch_page, 0, limit)
+        yield first_page.get('items') or []
+
+        offsets = range(limit, first_page.get('total') or 0, limit)
+        # ordered_map() keeps the order of the offsets, whatever the order in which the pages are received
+        for page in ordered_map(lambda offset: self.get_page(fetch_page, offset, limit), offsets,
+                                max_workers=cfg.get("spotify-workers", 1)):
+            yield page.get('items') or []
+
+    def iter_playlist_tracks(self, playlist_id: str) -> Iterator[list[SpotifyTrack]]:
+        """Iterate over the tracks of a playlist, page by page (only the fields used are requested)."""
+        pages = self.iter_pages(lambda **kwargs: self.client.playlist_items(
+            playlist_id, fields=PLAYLIST_ITEMS_FIELDS, additional_types='track', **kwargs))
+        return map(SpotifyTrack.from_items, pages)
 
+    @cachebox.cached(cachebox.LRUCache(maxsize=128))
+    def get_playlist_tracks(self, playlist_id: str) -> list[SpotifyTrack]:
+        tracks = []
+        for page in self.iter_playlist_tracks(playlist_id):
+            tracks.extend(page)
         return tracks
 
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
     @rate_limit
-    def get_track(self, track_id):
-        return self.client.track(track_id)
+    def get_track(self, track_id) -> Optional[SpotifyTrack]:
+        return SpotifyTrack.from_item(self.client.track(track_id))
 
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
     @rate_limit
     def get_album(self, album_id):
         return self.client.album(album_id)
 
+    @rate_limit
+    def get_albums_batch(self, album_ids: list[str]) -> list[dict]:
+        """Get up to 20 albums in a single request."""
+        return [album for album in self.client.albums(album_ids).get('albums', []) if album]
+
+    def get_albums(self, album_ids: list[str]) -> dict[str, dict]:
+        """
+        Get multiple albums using the multiple albums endpoint (20 albums per request, requests sent concurrently).
+
+        :param album_ids: IDs of the albums to get (duplicates are ignored) :list
+        :return: Albums found by ID :class:`dict`
+        """
+        album_ids = list(dict.fromkeys(album_id for album_id in album_ids if album_id))
+        batches = [album_ids[i:i + ALBUMS_BATCH_SIZE] for i in range(0, len(album_ids), ALBUMS_BATCH_SIZE)]
+
+        albums = {}
+        with ThreadPoolExecutor(max_workers=max(1, cfg.get("spotify-workers", 1))) as executor:
+            for batch in executor.map(self.get_albums_batch, batches):
+                albums.update((album['id'], album) for album in batch)
+        return albums
+
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
     @rate_limit
     def get_artist(self, artist_id):
@@ -60,20 +165,44 @@ class SpotifyManager:
 
         return None
 
+    def iter_liked_songs(self, added_after: str = None) -> Iterator[list[SpotifyTrack]]:
+        """
+        Iterate over the liked songs of the user (newest first), page by page.
+
+        :param added_after: Only return the songs added since this ``added_at`` watermark (included, as other songs can
+                            share its timestamp), paging stops as soon as an older song is reached :str
+        :return: Iterator over the tracks of each page :class:`Iterator[list[SpotifyTrack]]`
+        """
+        if not added_after:
+            yield from map(SpotifyTrack.from_items, self.iter_pages(self.client.current_user_saved_tracks))
+            return
+
+        offset = 0
+        while True:
+            items = self.get_page(self.client.current_user_saved_tracks, offset).get('items') or []
+            # ISO 8601 timestamps compare chronologically as strings
+            new_items = [item for item in items if (item.get('added_at') or '') >= added_after]
+            if new_items:
+                yield SpotifyTrack.from_items(new_items)
+
+            if len(new_items) < len(items) or len(items) < PAGE_SIZE:
+                return
+            offset += len(items)
+
     @cachebox.cached(cachebox.LRUCache(maxsize=16))
-    @rate_limit
-    def get_liked_songs(self):
+    def get_liked_songs(self, added_after: str = None) -> list[SpotifyTrack]:
+        """Get the liked songs of the user, newest first (see :func:`iter_liked_songs`)."""
         tracks = []
-        results = self.client.current_user_saved_tracks(limit=50)
-        tracks.extend(results.get('items'))
-
-        while results.get('next'):
-            time.sleep(random.uniform(0.1, 0.3))
-            results = self.client.current_user_saved_tracks(limit=50, offset=len(tracks))
-            tracks.extend(results.get('items'))
-
+        for page in self.iter_liked_songs(added_after):
+            tracks.extend(page)
         return tracks
 
+    def get_liked_songs_state(self) -> str:
+        """Get a cheap fingerprint (total and newest ``added_at``) of the liked songs, changing when songs are added or removed."""
+        page = self.get_page(self.client.current_user_saved_tracks, 0, limit=1)
+        items = page.get('items') or [{}]
+        return f"{page.get('total', 0)}|{items[0].get('added_at', '')}"
+
     @cachebox.cached(cachebox.LRUCache(maxsize=2))
     @rate_limit
     def get_all_playlists_tracks(self):
@@ -90,7 +219,13 @@ class SpotifyManager:
     @cachebox.cached(cachebox.LRUCache(maxsize=32))
     @rate_limit
     def get_playlist(self, playlist_id):
-        return self.client.playlist(playlist_id)
+        return self.client.playlist(playlist_id, fields=PLAYLIST_FIELDS)
+
+    @rate_limit
+    def get_playlist_snapshot(self, playlist_id) -> tuple[str, str]:
+        """Get the ID and the current snapshot ID (changing with every modification) of a playlist, without its tracks."""
+        playlist = self.client.playlist(playlist_id, fields="id,snapshot_id")
+        return playlist['id'], playlist['snapshot_id']
 
     def get_playlist_with_tracks(self, playlist_id):
         playlist = self.get_playlist(playlist_id)
@@ -1,6 +1,13 @@
 import concurrent
+import copy
+import itertools
+import random
+import sqlite3
+import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, List, Any
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, List, Any, TYPE_CHECKING
 
 import cachebox
 import requests
@@ -11,13 +18,21 @@ from tidalapi.exceptions import MetadataNotAvailable, ObjectNotFound
 from tidalapi.session import SearchResults
 
 from spotidalyfin import cfg
-from spotidalyfin.utils.comparisons import weighted_word_overlap, close
+from spotidalyfin.managers.spotify_manager import SpotifyTrack
+from spotidalyfin.utils import http
+from spotidalyfin.utils.comparisons import close, get_tokens, tokens_overlap
 from spotidalyfin.utils.decorators import rate_limit
-from spotidalyfin.utils.file_utils import extract_flac_from_mp4, move_file, create_file
-from spotidalyfin.utils.formatting import format_artists
+from spotidalyfin.utils.file_utils import extract_flac_from_mp4, move_file, create_file, stream_flac_from_mp4
+from spotidalyfin.utils.formatting import format_artists, normalize
+from spotidalyfin.utils.journal import DownloadJournal
 from spotidalyfin.utils.logger import log
+from spotidalyfin.utils.pipeline import ordered_map
+from spotidalyfin.utils.rate_limiter import RateLimiter
 from spotidalyfin.utils.metadata import set_audio_tags, get_track_metadata, format_track_path_from_metadata
 
+if TYPE_CHECKING:
+    from spotidalyfin.db.database import Database
+
 QUALITIES = {
     "DOLBY_ATMOS": 0,
     "LOW": 1,
@@ -27,10 +42,163 @@ QUALITIES = {
 
 QUALITIES_REVERSE = {v: k for k, v in QUALITIES.items()}
 
+MIN_MATCH_SCORE = 3.5
+# Tracks of an album are only accepted with a higher score, whether they are matched one by one or a whole album at once
+MIN_ALBUM_MATCH_SCORE = 4
+
+# Paces all the calls to the Tidal API, whatever the thread they are sent from
+RATE_LIMITER = RateLimiter()
+
+SEGMENT_RETRIES = 3
+
+# Tokens too common to tell tracks apart in the local catalog (each would match a large part of it)
+CATALOG_STOPWORDS = frozenset({
+    "a", "an", "and", "the", "of", "in", "on", "to", "for", "with", "by", "at", "my", "me", "you", "i", "is", "it",
+    "feat", "ft", "remix", "mix", "edit", "version", "remastered", "remaster", "live", "original", "radio",
+    "de", "la", "le", "les", "el", "los", "las", "y", "et", "du", "des", "un", "une",
+})
+
+
+def download_segment(url: str) -> bytes:
+    """Download a segment of a track, retrying a few times (with backoff) if the request fails."""
+    retry_count = 0
+    while True:
+        try:
+            # Only retried here, not by the session as well
+            r = http.get(url, retry=False)
+            r.raise_for_status()
+            return r.content
+        except requests.RequestException as e:
+            if retry_count >= SEGMENT_RETRIES:
+                raise e
+            retry_count += 1
+            log.debug(f"Segment download failed ({e}), retrying")
+            time.sleep(2 ** retry_count / 4 + random.uniform(0.1, 0.4))
+
+
+def get_catalog_keys(name: str, artists: list[str], isrc: str = None, upc: str = None) -> list[str]:
+    """Get the keys of a track in the local catalog: its ISRC, the UPC of its album and its normalized tokens."""
+    keys = {f"token:{token}" for token in normalize(" ".join([name, *artists])) if token not in CATALOG_STOPWORDS}
+    if isrc:
+        keys.add(f"isrc:{isrc.upper()}")
+    if upc:
+        keys.add(f"upc:{upc}")
+    return sorted(keys)
+
+
+def artist_to_json(artist: Artist) -> dict:
+    """Serialize a Tidal artist back to the shape of the Tidal API (only the fields used)."""
+    return {"id": artist.id, "name": artist.name, "picture": getattr(artist, "picture", None)}
+
+
+def track_to_json(track: Track) -> dict:
+    """
+    Serialize a Tidal track (with its album and artists) back to the shape of the Tidal API, keeping only the fields
+    used by the pipeline, so that it can be stored and parsed again by tidalapi (see :func:`TidalManager.parse_track`).
+    """
+    album = track.album
+    return {
+        "id": track.id,
+        "title": track.name,
+        "version": track.version,
+        "duration": track.duration,
+        "explicit": track.explicit,
+        "allowStreaming": track.allow_streaming,
+        "streamReady": track.stream_ready,
+        "stemReady": getattr(track, "stem_ready", False),
+        "djReady": getattr(track, "dj_ready", False),
+        "adSupportedStreamReady": getattr(track, "ad_supported_stream_ready", False),
+        "streamStartDate": track.tidal_release_date.isoformat() if track.tidal_release_date else None,
+        "trackNumber": track.track_num,
+        "volumeNumber": track.volume_num,
+        "popularity": track.popularity,
+        "isrc": track.isrc,
+        "copyright": track.copyright,
+        "audioQuality": track.audio_quality,
+        "audioModes": track.audio_modes,
+        "mediaMetadata": {"tags": track.media_metadata_tags or []},
+        "artist": artist_to_json(track.artist),
+        "artists": [artist_to_json(artist) for artist in track.artists],
+        "album": {
+            "id": album.id,
+            "title": album.name,
+            "cover": album.cover,
+            "videoCover": album.video_cover,
+            "numberOfTracks": album.num_tracks,
+            "numberOfVolumes": album.num_volumes,
+            "releaseDate": album.release_date.isoformat() if album.release_date else None,
+            "upc": album.upc
+        } if album else None
+    }
+
+
+class TrackScorer:
+    """
+    Calculate the matching score between Tidal tracks and a Spotify track, the Spotify track being preprocessed once
+    for all the candidates.
+
+    The score is calculated based on the following criteria:
+    - Duration (1 point)
+    - ISRC (0.5 point)
+    - Title (1 point)
+    - Album name (1.5 point)
+    - Artists (1 point)
+
+    Minimum score to consider a match : 3.5
+    Maximum score : 5
+    """
+
+    def __init__(self, spotify_track: SpotifyTrack):
+        self.duration = spotify_track.duration
+        self.isrc = spotify_track.isrc
+        self.name_tokens = get_tokens(spotify_track.name)
+        self.album_tokens = get_tokens(spotify_track.album_name)
+        self.artists = format_artists(spotify_track.artists)
+
+    def score(self, track: Track) -> float:
+        """Score a Tidal track :class:`Track`."""
+        score = 0  # max : 5
+
+        if close(track.duration, self.duration):
+            score += 1
+        if (track.isrc or '').upper() == self.isrc:
+            score += 0.5
+        if tokens_overlap(get_tokens(track.full_name), self.name_tokens) > 0.7:
+            score += 1
+        if tokens_overlap(get_tokens(track.album.name), self.album_tokens) > 0.35:
+            score += 1.5
+        if self.artists_match(track):
+            score += 1
+        return score
+
+    def score_all(self, tracks: list[Track]) -> list[float]:
+        """Score a list of Tidal tracks, in the same order."""
+        return [self.score(track) for track in tracks]
+
+    def artists_match(self, track: Track) -> bool:
+        """Check if all the artists of the Spotify track are credited on a Tidal track."""
+        tidal_artists = format_artists(track.artists)
+        return all(artist in tidal_artists for artist in self.artists)
+
+
+@dataclass(slots=True)
+class DownloadedTrack:
+    """Track downloaded to its temporary file, waiting to be finalized (see :func:`TidalManager.finalize_track`)."""
+    track: Track
+    journal: DownloadJournal
+    file: Path
+    metadata: dict
+    final_path: Path
+    downloaded_bytes: int
+    task: Optional[int] = None
+
 
 class TidalManager:
 
-    def __init__(self):
+    def __init__(self, db: "Database" = None):
+        """
+        :param db: Optional database where the probed audio resolutions are persisted :class:`Database`
+        """
         session_file = cfg.get("config-dir") / "tidal-session-pkce.json"
         session_file.parent.mkdir(parents=True, exist_ok=True)
 
@@ -38,23 +206,35 @@ class TidalManager:
         self.client.login_session_file(session_file, do_pkce=True)
         self.client.audio_quality = QUALITIES_REVERSE.get(cfg.get("quality"))
 
+        # Shared by all the tracks being matched concurrently (ISRC, barcode and text searches of each track)
+        self.search_executor = ThreadPoolExecutor(max_workers=max(1, cfg.get("match-workers", 1)) * 3,
+                                                  thread_name_prefix="tidal-search")
+
+        self.db = db
+        # Audio resolutions (bit depth, sample rate) by track id, the same tracks come back for multiple candidates
+        self.audio_resolutions = cachebox.LRUCache(maxsize=4096)
+
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def get_track(self, track_id) -> Track:
         return self.client.track(track_id)
 
+    def parse_track(self, json_obj: dict) -> Track:
+        """Parse a track serialized with :func:`track_to_json` (no API call)."""
+        return self.client.parse_track(json_obj)
+
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def get_album(self, album_id) -> Album:
         return self.client.album(album_id)
 
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def get_artist(self, artist_id) -> Artist:
         return self.client.artist(artist_id)
 
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def search_artist(self, artist_name: str) -> Optional[Artist]:
         artists = self.search(artist_name, models=[Artist]).get('artists')
         if artists:
@@ -62,19 +242,21 @@ class TidalManager:
 
         return None
 
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def search(self, query, models: Optional[List[Optional[Any]]] = None, limit=7) -> SearchResults:
         query = query[:99] if len(query) > 99 else query
         models = models or [media.Track]
         return self.client.search(query, limit=limit, models=models)
 
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def get_album_tracks(self, album: Album) -> list[Track]:
-        return album.tracks()
+        tracks = album.tracks()
+        self.index_tracks(tracks, upc=album.upc)
+        return tracks
 
     @cachebox.cached(cachebox.LRUCache(maxsize=256))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def search_albums(self, album_name: str = None, artist_name: str = None, barcode=None) -> list[Album]:
         try:
             if barcode:
@@ -89,69 +271,194 @@ class TidalManager:
         return []
 
     @cachebox.cached(cachebox.LRUCache(maxsize=128))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def search_tracks(self, track_name: str = None, artist_name: str = None, isrc: str = None) -> list[Track]:
         try:
             if isrc:
-                return self.client.get_tracks_by_isrc(isrc.upper()) or []
-            if track_name and artist_name:
-                return self.search(f"{track_name} {artist_name}").get('tracks') or []
+                tracks = self.client.get_tracks_by_isrc(isrc.upper()) or []
+            elif track_name and artist_name:
+                tracks = self.search(f"{track_name} {artist_name}").get('tracks') or []
+            else:
+                return []
         except (ObjectNotFound, KeyError):
             return []
 
-        return []
+        self.index_tracks(tracks)
+        return tracks
 
-    def search_for_track_in_album(self, album: Album, spotify_track: dict) -> Optional[Track]:
+    def index_tracks(self, tracks: list[Track], upc: str = None):
+        """
+        Add tracks fetched from Tidal to the local catalog of the database (if any), see :func:`search_catalog`.
+
+        :param tracks: Tidal tracks
+        :param upc: UPC of the album of the tracks, if they all come from the same album
+        """
+        if not self.db or not tracks:
+            return
+
+        try:
+            self.db.put_catalog_tracks([
+                (track, get_catalog_keys(track.full_name or "", [artist.name for artist in track.artists or []],
+                                         track.isrc, upc or getattr(track.album, "upc", None)))
+                for track in tracks
+            ])
+        except (sqlite3.Error, AttributeError, TypeError, ValueError) as e:
+            log.warning(f"Could not index Tidal tracks: {e}")
+
+    def search_catalog(self, spotify_track: SpotifyTrack) -> list[Track]:
+        """
+        Search the local catalog (the tracks fetched from Tidal by the previous searches, see :func:`index_tracks`)
+        for the candidates of a Spotify track, without any API call.
+
+        :param spotify_track: Spotify track to search for
+        :return: Candidates found, the most likely first :class:`list[Track]`
+        """
+        if not self.db:
+            return []
+
+        keys = get_catalog_keys(spotify_track.name, list(spotify_track.artists), spotify_track.isrc,
+                                spotify_track.album_upc)
+        tracks = []
+        for data in self.db.search_catalog(keys, cfg.get("tidal-cache-ttl") * 24 * 3600):
+            try:
+                tracks.append(self.parse_track(data))
+            except Exception as e:
+                log.debug(f"Could not parse cached Tidal track {data.get('id')}: {e}")
+        return tracks
+
+    def search_for_track_in_album(self, album: Album, spotify_track: SpotifyTrack) -> Optional[Track]:
+        scorer = TrackScorer(spotify_track)
         for track in self.get_album_tracks(album):
-            if self.get_track_matching_score(track, spotify_track) >= 4:
+            if scorer.score(track) >= MIN_ALBUM_MATCH_SCORE:
                 return track
         return None
 
-    def search_spotify_track(self, spotify_track: dict, quality: int) -> Optional[Track]:
+    def match_album_tracks(self, spotify_tracks: list[SpotifyTrack], quality: int) -> dict[str, Track]:
+        """
+        Match tracks from the same Spotify album at once: the Tidal album is resolved once (by barcode) and all the
+        tracks are assigned in a single pass over the album tracks.
+
+        Each album track goes to the Spotify track it matches best (ISRC match first, then score, at least
+        ``MIN_ALBUM_MATCH_SCORE`` as in :func:`search_for_track_in_album`), and each Spotify track gets its best
+        candidate at or below the wanted quality. The candidates not in the wanted quality are
+        returned too, :func:`search_spotify_track` can look for a better one without searching the album again.
+
+        :param spotify_tracks: Spotify tracks from the same album
+        :param quality: Wanted quality
+
+        :return: Best Tidal track found (annotated copy) by Spotify track ID :class:`dict[str, Track]`
+        """
+        album_barcode = spotify_tracks[0].album_upc if spotify_tracks else None
+        if not album_barcode:
+            return {}
+
+        scorers = {spotify_track.id: TrackScorer(spotify_track) for spotify_track in spotify_tracks}
+        matches = {}
+        for album in self.search_albums(barcode=album_barcode):
+            remaining = [spotify_track for spotify_track in spotify_tracks
+                         if spotify_track.id not in matches or matches[spotify_track.id].real_quality_score != quality]
+            if not remaining:
+                break
+
+            # Every pair over the minimum score, the best pairs are assigned first
+            pairs = []
+            for album_track in self.get_album_tracks(album):
+                for spotify_track in remaining:
+                    score = scorers[spotify_track.id].score(album_track)
+                    if score >= MIN_ALBUM_MATCH_SCORE:
+                        isrc_match = bool(spotify_track.isrc) and (album_track.isrc or '').upper() == spotify_track.isrc
+                        pairs.append((isrc_match, score, album_track, spotify_track))
+            pairs.sort(key=lambda pair: pair[:2], reverse=True)
+
+            assigned_tracks, assigned_ids = set(), set()
+            for _, score, album_track, spotify_track in pairs:
+                if album_track.id in assigned_tracks or spotify_track.id in assigned_ids:
+                    continue
+                assigned_tracks.add(album_track.id)
+                assigned_ids.add(spotify_track.id)
+
+                real_quality = self.get_real_audio_quality(album_track)
+                real_quality_score = QUALITIES.get(real_quality)
+                previous = matches.get(spotify_track.id)
+                if real_quality_score > quality or (
+                        previous and (previous.real_quality_score, previous.score) >= (real_quality_score, score)):
+                    continue
+
+                track = copy.copy(album_track)
+                track.score = score
+                track.real_quality = real_quality
+                track.real_quality_score = real_quality_score
+                matches[spotify_track.id] = track
+
+        return matches
+
+    def search_spotify_track(self, spotify_track: SpotifyTrack, quality: int, album_searched: bool = False,
+                             album_candidate: Track = None) -> Optional[Track]:
         """
         Search for a Spotify track on Tidal and return the best match using various search methods.
 
         :param spotify_track: Spotify track to search for
         :param quality: Maximum wanted quality
+        :param album_searched: Whether the album of the track was already searched (see :func:`match_album_tracks`)
+        :param album_candidate: Best match found in the album of the track, returned if nothing better is found
 
         :return: Best match found on Tidal :class:`Track`
         """
-        track_name = spotify_track.get('name', '')
-        artist_name = format_artists(spotify_track.get('artists', [{}]), lower=False)[0]
-        album_name = spotify_track.get('album', {}).get('name', '')
-        album_barcode = spotify_track.get('album', {}).get('external_ids', {}).get('upc', '')
-        isrc = spotify_track.get('external_ids', {}).get('isrc', '').upper()
+        track_name = spotify_track.name
+        artist_name = format_artists(spotify_track.artists or [""], lower=False)[0]
+        album_name = spotify_track.album_name
+        album_barcode = spotify_track.album_upc
+        isrc = spotify_track.isrc
 
         if not (track_name and artist_name and album_name):
             return None
 
-        matches = []
-        futures = []
+        # The tracks already fetched by the previous searches are enough most of the time
+        local_tracks = self.search_catalog(spotify_track)
+        if local_tracks:
+            best_track = self.get_best_match(local_tracks, spotify_track, quality)
+            if best_track and best_track.real_quality_score == quality and best_track.score >= MIN_MATCH_SCORE:
+                log.debug(f"Track {spotify_track.name} found in the local catalog")
+                return best_track
+
+        matches = [album_candidate] if album_candidate else []
+        albums = []
+
+        # Searches by priority, the lower priority ones being speculative: they are cancelled (if not started yet) as
+        # soon as a definitive match is found
+        isrc_future = self.search_executor.submit(self.search_tracks, isrc=isrc) if isrc else None
+        futures = [future for future in (
+            isrc_future,
+            self.search_executor.submit(self.search_albums, barcode=album_barcode)
+            if album_barcode and not album_searched else None,
+            self.search_executor.submit(self.search_tracks, track_name=track_name, artist_name=artist_name)
+        ) if future]
 
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            if isrc:
-                futures.append(executor.submit(self.search_tracks, isrc=isrc))
-            if album_barcode:
-                futures.append(executor.submit(self.search_albums, barcode=album_barcode))
-            futures.append(executor.submit(self.search_tracks, track_name=track_name, artist_name=artist_name))
-
-            results = [f.result() for f in concurrent.futures.as_completed(futures)]
-
-        for result in results:
-            if result and isinstance(result, list):
-                # Track
-                if isinstance(result[0], Track):
-                    best_track = self.get_best_match(result, spotify_track, quality)
-                    if best_track:
-                        if best_track.real_quality_score == quality and best_track.score >= 3.5:
-                            return best_track
-                        if best_track not in matches:
-                            matches.append(best_track)
-                # Album
-                elif isinstance(result[0], Album):
-                    for album in result:
+        try:
+            isrc_evaluated = isrc_future is None
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                isrc_evaluated = isrc_evaluated or future is isrc_future
+
+                if result and isinstance(result, list):
+                    # Track
+                    if isinstance(result[0], Track):
+                        best_track = self.get_best_match(result, spotify_track, quality)
+                        if best_track:
+                            if best_track.real_quality_score == quality and best_track.score >= MIN_MATCH_SCORE:
+                                return best_track
+                            if best_track not in matches:
+                                matches.append(best_track)
+                    # Album
+                    elif isinstance(result[0], Album):
+                        albums.extend(result)
+
+                # Listing the tracks of the albums is costly, only do it if the ISRC search found nothing definitive
+                if albums and isrc_evaluated:
+                    for album in albums:
                         track = self.search_for_track_in_album(album, spotify_track)
                         if track:
+                            track = copy.copy(track)
                             track.real_quality = self.get_real_audio_quality(track)
                             track.real_quality_score = QUALITIES.get(track.real_quality)
                             if track.real_quality_score <= quality:
@@ -160,6 +467,10 @@ class TidalManager:
 
                                 if track not in matches:
                                     matches.append(track)
+                    albums = []
+        finally:
+            for future in futures:
+                future.cancel()
 
         return self.get_best_match(matches, spotify_track, quality) if matches else None
 
@@ -167,7 +478,7 @@ class TidalManager:
         """Get the real audio quality of a track."""
         if cfg.get('debug'):
             print(
-                f"{track.id} - Qly:{track.audio_quality} - Atmos:{track.is_DolbyAtmos} - Master:{track.is_Mqa} - HiRes:{track.is_HiRes} - {self.get_stream(track).get_audio_resolution()}")
+                f"{track.id} - Qly:{track.audio_quality} - Atmos:{track.is_DolbyAtmos} - Master:{track.is_Mqa} - HiRes:{track.is_HiRes} - {self.get_audio_resolution(track)}")
 
         if track.is_DolbyAtmos:
             return "DOLBY_ATMOS"
@@ -185,7 +496,7 @@ class TidalManager:
 
         elif track.audio_quality == 'HIGH':
             if cfg.get("quality") >= 2:
-                res = self.get_stream(track).get_audio_resolution()
+                res = self.get_audio_resolution(track)
                 if res[0] >= 16 and res[1] >= 44100:
                     return "LOSSLESS"
 
@@ -195,13 +506,43 @@ class TidalManager:
             log.warning(f"Unknown audio quality for track {track.id}")
             return "LOW"
 
+    def get_audio_resolution(self, track: Track) -> tuple[int, int]:
+        """
+        Get the audio resolution of a track.
+
+        The stream of the track is only requested the first time, the resolution is then kept in memory and in the
+        database (if any) for the next candidates, runs and downloads. The one in the database is probed again once
+        older than the ``tidal-cache-ttl`` setting or if the audio quality of the track changed (e.g. remastered).
+
+        :param track: Tidal track :class:`Track`
+        :return: Bit depth and sample rate of the track :class:`tuple[int, int]`
+        """
+        resolution = self.audio_resolutions.get(track.id)
+        if resolution is None and self.db:
+            resolution = self.db.get_audio_resolution(track.id, track.audio_quality,
+                                                      cfg.get("tidal-cache-ttl") * 24 * 3600)
+        if resolution is None:
+            resolution = self.save_audio_resolution(track, self.get_stream(track))
+
+        self.audio_resolutions[track.id] = resolution
+        return resolution
+
+    def save_audio_resolution(self, track: Track, stream: media.Stream) -> tuple[int, int]:
+        """Keep the audio resolution of a stream already requested for a track (see :func:`get_audio_resolution`)."""
+        resolution = tuple(stream.get_audio_resolution())
+        self.audio_resolutions[track.id] = resolution
+        if self.db:
+            self.db.put_audio_resolution(track.id, track.audio_quality, *resolution)
+        return resolution
+
     @cachebox.cached(cachebox.LRUCache(maxsize=64))
-    @rate_limit
+    @rate_limit(limiter=RATE_LIMITER)
     def get_stream(self, track: Track) -> media.Stream:
         """Get the stream of a track (uses caching)."""
         return track.get_stream()
 
     @cachebox.cached(cachebox.LRUCache(maxsize=32))
+    @rate_limit(limiter=RATE_LIMITER)
     def get_lyrics(self, track: Track) -> str:
         """Get the lyrics of a track (uses caching)."""
         try:
@@ -212,7 +553,7 @@ class TidalManager:
         except KeyError:
             return ""
 
-    def get_best_match(self, tidal_tracks: list[Track], spotify_track: dict, quality: int) -> Optional[Track]:
+    def get_best_match(self, tidal_tracks: list[Track], spotify_track: SpotifyTrack, quality: int) -> Optional[Track]:
         """
         Get the best match from a list of Tidal tracks based on a Spotify track.
 
@@ -223,98 +564,124 @@ class TidalManager:
         If multiple tracks have the same quality, the one with the highest score will be returned.
 
         :param tidal_tracks: List of Tidal tracks to compare :class:`list[Track]`
-        :param spotify_track: Spotify track to compare :class:`dict`
+        :param spotify_track: Spotify track to compare :class:`SpotifyTrack`
         :param quality: Maximum wanted quality :class:`int`
 
         :return: Best match found on Tidal :class:`Track`
         """
+        ranked = self.rank_candidates(tidal_tracks, spotify_track, quality)
+        return ranked[0] if ranked else None
 
-        matches = []
-        best_quality = -1
-
-        for track in tidal_tracks:
-            track.score = self.get_track_matching_score(track, spotify_track)
-            track.real_quality = self.get_real_audio_quality(track)
-            track.real_quality_score = QUALITIES.get(track.real_quality)
-            if track.score >= 3.5 and track.real_quality_score <= quality:
-                if track.real_quality_score > best_quality:
-                    best_quality = track.real_quality_score
-                    matches = [track]
-                elif track.real_quality_score == best_quality:
-                    matches.append(track)
-
-        if matches and isinstance(matches, list):
-            return max(matches, key=lambda x: x.score)
-        else:
-            return None
-
-    def get_track_matching_score(self, track: Track, spotify_track: dict) -> float:
+    def rank_candidates(self, tidal_tracks: list[Track], spotify_track: SpotifyTrack, quality: int) -> list[Track]:
         """
-        Calculate the matching score between a Tidal track and a Spotify track.
+        Score a list of Tidal tracks against a Spotify track at once and rank them (see :func:`get_best_match`).
 
-        The score is calculated based on the following criteria:
-        - Duration (1 point)
-        - ISRC (0.5 point)
-        - Title (1 point)
-        - Album name (1.5 point)
-        - Artists (1 point)
+        The Spotify track is preprocessed once for all the candidates, and the candidates under the minimum score are
+        pruned before probing the real audio quality (which can require an API call).
 
-        Minimum score to consider a match : 3.5
-        Maximum score : 5
+        :param tidal_tracks: List of Tidal tracks to compare :class:`list[Track]`
+        :param spotify_track: Spotify track to compare :class:`SpotifyTrack`
+        :param quality: Maximum wanted quality :class:`int`
+
+        :return: Matching tracks (annotated copies) ranked by quality then score, best first :class:`list[Track]`
+        """
+        scorer = TrackScorer(spotify_track)
+        candidates = [(score, track) for score, track in zip(scorer.score_all(tidal_tracks), tidal_tracks)
+                      if score >= MIN_MATCH_SCORE]
+
+        ranked = []
+        for score, track in candidates:
+            real_quality = self.get_real_audio_quality(track)
+            if QUALITIES.get(real_quality) > quality:
+                continue
+
+            # Candidates come from cached results shared by the tracks matched concurrently, annotate a copy
+            track = copy.copy(track)
+            track.score = score
+            track.real_quality = real_quality
+            track.real_quality_score = QUALITIES.get(real_quality)
+            ranked.append(track)
+
+        # Stable sort, the first of the candidates with the same quality and score wins
+        ranked.sort(key=lambda x: (x.real_quality_score, x.score), reverse=True)
+        return ranked
+
+    def get_track_matching_score(self, track: Track, spotify_track: SpotifyTrack) -> float:
+        """
+        Calculate the matching score between a Tidal track and a Spotify track (see :class:`TrackScorer`).
 
         :param track: Tidal track to compare :class:`Track`
-        :param spotify_track: Spotify track to compare :class:`dict`
+        :param spotify_track: Spotify track to compare :class:`SpotifyTrack`
 
         """
-        score = 0  # max : 5
+        return TrackScorer(spotify_track).score(track)
 
-        if close(track.duration, spotify_track.get('duration_ms', 0) / 1000):
-            score += 1
-        if track.isrc.upper() == spotify_track.get('external_ids', {}).get('isrc', '').upper():
-            score += 0.5
-        if weighted_word_overlap(track.full_name, spotify_track.get('name', '')) > 0.7:
-            score += 1
-        if weighted_word_overlap(track.album.name, spotify_track.get('album', {}).get('name', '')) > 0.35:
-            score += 1.5
-        if all(artist in format_artists(track.artists) for artist in format_artists(spotify_track.get('artists', []))):
-            score += 1
-        return score
+    def download_track(self, track: Track, progress: Progress = None) -> int:
+        """
+        Download a track, tag it and move it to the output directory (see :func:`fetch_track` and
+        :func:`finalize_track`, which can also be run by separate pools).
 
-    def download_track(self, track: Track, progress: Progress = None):
-        # Retrive all the download urls
-        stream_manifest = self.get_stream(track).get_stream_manifest()
-        download_urls = stream_manifest.get_urls()
+        :return: Number of bytes downloaded :class:`int`
+        """
+        downloaded = self.fetch_track(track, progress)
+        if not downloaded:
+            return 0
+
+        self.finalize_track(downloaded, progress)
+        return downloaded.downloaded_bytes
 
-        # Add lyrics to track (to embed in the file)
-        track.lyrics = self.get_lyrics(track)
-        # Extract metadata from track to embed in the file
-        metadata = get_track_metadata(track)
+    @staticmethod
+    def get_track_path(track: Track) -> Path:
+        """Get the path of a track in the output directory, from the data of the track only (no network call)."""
+        return cfg.get("out-dir") / format_track_path_from_metadata(get_track_metadata(track, include_cover=False))
 
-        # Create temporary file
-        tmp_file = create_file(cfg.get("dl-dir") / f"{track.id}.tmp")
-        # Get final path of file after download
-        final_path = cfg.get("out-dir") / format_track_path_from_metadata(metadata)
+    def fetch_track(self, track: Track, progress: Progress = None) -> Optional["DownloadedTrack"]:
+        """
+        Download a track to its temporary file (network part of :func:`download_track`).
+
+        The download is journaled (see :class:`DownloadJournal`): an interrupted download resumes from the last
+        segment written, and a complete one is only tagged and moved, without any network call.
+
+        :return: Downloaded track to finalize, None if it is already in the output directory :class:`DownloadedTrack`
+        """
+        journal = DownloadJournal(cfg.get("dl-dir"), track.id)
+
+        # Get final path of file after download (checked before any network call)
+        final_path = self.get_track_path(track)
 
         if final_path.exists():
             log.debug(f"Track already downloaded : {track.id}")
-            cfg.put("already-downloaded", cfg.get("already-downloaded", 0) + 1)
-            return
+            if journal.file:
+                journal.file.unlink(missing_ok=True)
+            journal.remove()
+            return None
 
+        metadata = journal.get_metadata()
+        if metadata is None:
+            # Add lyrics to track (to embed in the file)
+            track.lyrics = self.get_lyrics(track)
+            # Extract metadata from track to embed in the file
+            metadata = get_track_metadata(track)
+            journal.save_metadata(metadata)
+
+        task = None
         if progress:
-            task = progress.add_task(f"Downloading {track.full_name} - {track.artist.name}...",
-                                     total=len(download_urls))
+            task = progress.add_task(f"Downloading {track.full_name} - {track.artist.name}...", total=1)
 
-        with open(tmp_file, "wb") as f:
-            for url in download_urls:
-                if progress:
-                    progress.update(task, advance=1)
-                r = requests.get(url, stream=True, timeout=10)
-                r.raise_for_status()
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            log.debug(f"Downloaded track : {track.id}")
-        if not tmp_file.exists():
-            log.error(f"Download failed for track {track.id}")
+        if journal.complete and journal.file and journal.file.exists():
+            log.debug(f"Track already downloaded in a previous run, finalizing : {track.id}")
+            tmp_file, downloaded_bytes = journal.file, 0
+        else:
+            tmp_file, downloaded_bytes = self.download_track_segments(track, journal, progress, task)
+
+        if progress:
+            progress.update(task, description=f"Waiting to finalize {track.full_name} - {track.artist.name}...")
+
+        return DownloadedTrack(track, journal, tmp_file, metadata, final_path, downloaded_bytes, task)
+
+    def finalize_track(self, downloaded: "DownloadedTrack", progress: Progress = None):
+        """Convert (if needed), tag and move a downloaded track (CPU / disk part of :func:`download_track`)."""
+        track, journal, tmp_file, task = downloaded.track, downloaded.journal, downloaded.file, downloaded.task
 
         # if stream_manifest.is_encrypted:
         #     log.debug(f"Decrypting track {track.full_name} - {track.artist.name}")
@@ -324,24 +691,109 @@ class TidalManager:
         #     decrypt_file(str(tmp_file), tmp_path_file_decrypted, key, nonce)
 
         # Extract flac from mp4 container
-        if cfg.get("m4a2flac"):
-            if stream_manifest.mime_type.split("/")[-1] == "mp4":
+        if cfg.get("m4a2flac") and not journal.converted:
+            if journal.mime_type.split("/")[-1] == "mp4":
                 if progress:
                     progress.update(task, description="Extracting flac from m4a...")
                 log.debug(f"Extracting flac from m4a : {track.id}")
-                tmp_file = extract_flac_from_mp4(tmp_file)
+                flac_file = extract_flac_from_mp4(tmp_file)
+                # The original file is returned if the conversion failed
+                converted = flac_file != tmp_file
+                tmp_file = flac_file
 
                 if not tmp_file.exists():
                     log.error(f"M4A to FLC conversion failed for track {track.id}")
+                journal.set_file(tmp_file, converted=converted)
 
         # Saves metadata to file and move file to final destination
         if progress:
             progress.update(task, description="Setting audio tags...")
         log.debug(f"Setting audio tags and moving : {track.id}")
 
-        set_audio_tags(tmp_file, metadata)
-        move_file(tmp_file, final_path)
+        set_audio_tags(tmp_file, downloaded.metadata)
+        move_file(tmp_file, downloaded.final_path)
+        journal.remove()
 
         if progress:
-            progress.update(0, advance=1)
             progress.remove_task(task)
+
+    def download_track_segments(self, track: Track, journal: DownloadJournal, progress: Progress = None,
+                                task=None) -> tuple[Path, int]:
+        """
+        Download the segments of a track to its temporary file, resuming after the segments recorded in the journal
+        (if the stream still has the same segments).
+
+        :return: Temporary file of the track and number of bytes downloaded :class:`tuple[Path, int]`
+        """
+        # Retrive all the download urls
+        stream = self.get_stream(track)
+        stream_manifest = stream.get_stream_manifest()
+        self.save_audio_resolution(track, stream)
+        download_urls = stream_manifest.get_urls()
+
+        tmp_file = cfg.get("dl-dir") / f"{track.id}.tmp"
+        done = len(journal.sizes)
+        size = sum(journal.sizes)
+        resumable = (done > 0 and journal.segments == len(download_urls) and journal.file == tmp_file
+                     and tmp_file.exists() and tmp_file.stat().st_size >= size)
+
+        # DASH segments form a fragmented MP4, which FFmpeg can convert on the fly: only the FLAC file is written, the
+        # temporary file is only needed for the other containers or if the conversion fails
+        segments = None
+        streamed_sizes = []
+        if (not resumable and cfg.get("m4a2flac") and cfg.get("stream-ffmpeg") and stream_manifest.dash_info is not None
+                and stream_manifest.mime_type.split("/")[-1] == "mp4"):
+            flac_file = cfg.get("dl-dir") / f"{track.id}.flac"
+            journal.start(flac_file, len(download_urls), stream_manifest.mime_type)
+
+            def iter_segments():
+                for segment in ordered_map(download_segment, download_urls, max_workers=cfg.get("segment-workers")):
+                    streamed_sizes.append(len(segment))
+                    if progress:
+                        progress.update(task, advance=1)
+                    yield segment
+
+            if progress:
+                progress.update(task, total=len(download_urls), completed=0)
+            log.debug(f"Streaming track to FFmpeg : {track.id}")
+            segments = iter_segments()
+            # The conversion waits for the segments, it may take longer than the track on a slow link
+            if stream_flac_from_mp4(segments, flac_file, timeout=max(60, (track.duration or 0) * 4)):
+                journal.set_streamed(flac_file, streamed_sizes)
+                return flac_file, sum(streamed_sizes)
+
+            log.debug(f"Falling back to a temporary file : {track.id}")
+
+        if resumable:
+            log.debug(f"Resuming download of track {track.id} after {done}/{len(download_urls)} segments")
+        else:
+            done, size = 0, 0
+            create_file(tmp_file)
+            journal.start(tmp_file, len(download_urls), stream_manifest.mime_type)
+
+        if segments is not None:
+            # The segments already piped to FFmpeg are downloaded again, the next ones are taken from the stream
+            segments = itertools.chain(ordered_map(download_segment, download_urls[:len(streamed_sizes)],
+                                                   max_workers=cfg.get("segment-workers")), segments)
+        else:
+            segments = ordered_map(download_segment, download_urls[done:], max_workers=cfg.get("segment-workers"))
+
+        if progress:
+            progress.update(task, total=len(download_urls), completed=max(done, len(streamed_sizes)))
+
+        # Segments are downloaded concurrently but written in order, only a few of them are kept in memory
+        with open(tmp_file, "r+b") as f:
+            # Drops what was written after the last segment recorded
+            f.truncate(size)
+            f.seek(size)
+            for segment in segments:
+                f.write(segment)
+                f.flush()
+                journal.add_segment(len(segment))
+                if progress:
+                    progress.update(task, completed=max(len(journal.sizes), len(streamed_sizes)))
+            log.debug(f"Downloaded track : {track.id}")
+        if not tmp_file.exists():
+            log.error(f"Download failed for track {track.id}")
+
+        return tmp_file, sum(journal.sizes) - size
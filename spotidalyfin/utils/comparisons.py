@@ -1,5 +1,7 @@
 from collections import Counter
 
+import cachebox
+
 from spotidalyfin.utils.formatting import normalize
 
 
@@ -8,20 +10,34 @@ def close(a: int | float, b: int | float, delta: int = 3) -> bool | float:
     return abs(a - b) < delta
 
 
-def weighted_word_overlap(a: str, b: str) -> float:
-    """Calculate the weighted word overlap between two album titles."""
-    tokens_a = normalize(a)
-    tokens_b = normalize(b)
+@cachebox.cached(cachebox.LRUCache(maxsize=16384))
+def get_tokens(text: str) -> tuple[Counter, int]:
+    """
+    Get the normalized tokens of a text (see :func:`normalize`) counted, along with the total number of tokens.
+
+    The same names are compared over and over, so the result is memoized. It is shared between callers and must not be
+    modified.
+    """
+    counter = Counter(normalize(text))
+    return counter, sum(counter.values())
 
-    if not tokens_a or not tokens_b:
-        return 0.0
 
-    counter_a = Counter(tokens_a)
-    counter_b = Counter(tokens_b)
+def tokens_overlap(tokens_a: tuple[Counter, int], tokens_b: tuple[Counter, int]) -> float:
+    """Calculate the weighted word overlap between two texts already tokenized with :func:`get_tokens`."""
+    counter_a, total_a = tokens_a
+    counter_b, total_b = tokens_b
 
-    # Calculate the total number of words and common words
-    total_words = sum((counter_a | counter_b).values())  # Union of counters
-    common_words = sum((counter_a & counter_b).values())  # Intersection of counters
+    if not total_a or not total_b:
+        return 0.0
+
+    # Intersection of counters, the size of the union is deduced from it (max(a, b) = a + b - min(a, b))
+    common_words = sum((counter_a & counter_b).values())
+    total_words = total_a + total_b - common_words
 
     # Weighted ratio based on common words and total words
     return common_words / total_words
+
+
+def weighted_word_overlap(a: str, b: str) -> float:
+    """Calculate the weighted word overlap between two album titles."""
+    return tokens_overlap(get_tokens(a), get_tokens(b))
@@ -0,0 +1,65 @@
+import threading
+
+import cachebox
+
+from spotidalyfin import cfg
+from spotidalyfin.utils.file_utils import open_image_url
+from spotidalyfin.utils.logger import log
+
+# Covers of the albums being downloaded, the tracks of an album are usually downloaded together
+_covers = cachebox.LRUCache(maxsize=32)
+_locks: dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def get_album_cover(album_id, url: str, size: int) -> bytes:
+    """
+    Get the cover of an album, fetched only once: it is kept in memory (LRU) and on disk (``cache-dir/covers``), keyed
+    by album ID and size.
+
+    :param album_id: ID of the album
+    :param url: URL of the cover (used if it is not cached yet)
+    :param size: Size of the cover (part of the key, the same album can be fetched in other sizes)
+    :return: Image data :class:`bytes`
+    """
+    key = f"{album_id}_{size}"
+    cover = _covers.get(key)
+    if cover is not None:
+        return cover
+
+    # The tracks of the same album are downloaded concurrently, only one of them fetches the cover
+    with _locks_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+
+    with lock:
+        cover = _covers.get(key)
+        if cover is None:
+            cover = read_cached_cover(key)
+        if cover is None:
+            cover = open_image_url(url)
+            write_cached_cover(key, cover)
+        _covers[key] = cover
+
+    with _locks_lock:
+        _locks.pop(key, None)
+    return cover
+
+
+def read_cached_cover(key: str) -> bytes | None:
+    path = cfg.get("cache-dir") / "covers" / key
+    try:
+        return path.read_bytes() or None
+    except OSError:
+        return None
+
+
+def write_cached_cover(key: str, cover: bytes):
+    path = cfg.get("cache-dir") / "covers" / key
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside then renamed, so that concurrent runs never read a truncated cover
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(cover)
+        tmp_path.replace(path)
+    except OSError as e:
+        log.debug(f"Could not cache cover {key}: {e}")
@@ -1,33 +1,83 @@
+import functools
 import random
+import threading
 import time
 from pathlib import Path
 
+from spotipy import SpotifyException
 from tidalapi.exceptions import TooManyRequests
 
 from spotidalyfin.utils.logger import log
+from spotidalyfin.utils.rate_limiter import RateLimiter
 
 cache_dir = Path("~/.cache/spotidalyfin").expanduser()
 
 
-def rate_limit(func):
+_local = threading.local()
+
+
+def rate_limit(func=None, *, limiter: RateLimiter = None):
+    """
+    Retry the call when the server answers with a rate limit error.
+
+    With a ``limiter``, calls are also paced before being sent (only the outermost rate limited call of a thread is
+    paced, so calls nested in another one don't take a second token) and the limiter adapts its rate to the errors.
+    Can be used as ``@rate_limit`` or ``@rate_limit(limiter=...)``.
+    """
+    if func is None:
+        return functools.partial(rate_limit, limiter=limiter)
+
     def wrapper(*args, **kwargs):
         retry_count = 0
-        while True:
-            try:
-                return func(*args, **kwargs)
-            except TooManyRequests as e:
-                log.debug(f"Rate limit exceeded, retrying in a few seconds")
-                if retry_count < 7:
-                    retry_count += 1
-                    time.sleep(1.75 ** retry_count + random.uniform(0.1, 0.4))
-                else:
-                    raise RuntimeError("Rate limit exceeded") from e
-            except Exception as e:
-                raise e
+        nested = getattr(_local, "depth", 0) > 0
+        _local.depth = getattr(_local, "depth", 0) + 1
+        try:
+            while True:
+                if limiter and (not nested or retry_count):
+                    limiter.acquire()
+                try:
+                    result = func(*args, **kwargs)
+                    if limiter:
+                        limiter.on_success()
+                    return result
+                except (TooManyRequests, SpotifyException) as e:
+                    if isinstance(e, SpotifyException) and e.http_status != 429:
+                        raise e
+
+                    log.debug(f"Rate limit exceeded, retrying in a few seconds")
+                    if retry_count < 7:
+                        retry_count += 1
+                        if limiter:
+                            # The limiter slows down every thread, this thread still backs off before retrying
+                            limiter.on_throttle()
+                        time.sleep(max(get_retry_after(e), 1.75 ** retry_count) + random.uniform(0.1, 0.4))
+                    else:
+                        raise RuntimeError("Rate limit exceeded") from e
+                except Exception as e:
+                    raise e
+        finally:
+            _local.depth -= 1
 
     return wrapper
 
 
+def get_retry_after(e: Exception) -> float:
+    """
+    Get the delay (in seconds) requested by the server, 0 if not provided.
+
+    tidalapi exposes it as the ``retry_after`` attribute of :class:`TooManyRequests` (-1 when missing), spotipy as the
+    Retry-After header of :class:`SpotifyException`.
+    """
+    retry_after = getattr(e, "retry_after", None)
+    if retry_after is None:
+        headers = getattr(e, "headers", None) or {}
+        retry_after = headers.get("Retry-After", 0)
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return 0
+
+
 def debug_time(func):
     def wrapper(*args, **kwargs):
         start = time.time()
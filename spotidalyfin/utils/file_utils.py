@@ -1,15 +1,16 @@
 import base64
 import hashlib
+import io
 import shutil
 import subprocess
-import tempfile
 from pathlib import Path
+from typing import Iterable
 
-import requests
 from PIL import Image
 from PIL.Image import Resampling
 from ffmpeg import FFmpeg, FFmpegError
 
+from spotidalyfin.utils import http
 from spotidalyfin.utils.logger import log
 
 
@@ -122,19 +123,14 @@ def parse_secrets_file(secrets_file: Path) -> dict:
 
 def open_image_url(url: str) -> bytes:
     """Open an image URL and return the image data."""
-    response = requests.get(url, stream=True)
+    response = http.get(url)
     response.raise_for_status()
-
-    with tempfile.NamedTemporaryFile() as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-        f.seek(0)
-        return f.read()
+    return response.content
 
 
 def get_as_base64(url):
     try:
-        return base64.b64encode(requests.get(url).content)
+        return base64.b64encode(http.get(url).content)
     except:
         log.warning(f"Failed to get base64 from {url}")
         return None
@@ -157,6 +153,58 @@ def extract_flac_from_mp4(file_path: Path, timeout=25) -> Path:
     return file_out
 
 
+class ChunksReader(io.RawIOBase):
+    """Readable file-like object over an iterable of chunks of bytes (e.g. to feed FFmpeg's stdin)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.buffer:
+            self.buffer = next(self.chunks, None)
+            if self.buffer is None:
+                self.buffer = b""
+                return 0
+
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+def stream_flac_from_mp4(chunks: Iterable[bytes], file_out: Path, timeout: float = None) -> bool:
+    """
+    Extract a FLAC audio file from an MP4 stream piped into FFmpeg as it is received. The MP4 must be streamable
+    (fragmented, e.g. DASH segments).
+
+    :param chunks: Chunks of the MP4 file, in order
+    :param file_out: Path of the FLAC file
+    :param timeout: Maximum time (in seconds) for the whole conversion, including the time to receive the chunks
+    :return: True if the FLAC file was written, False if FFmpeg failed or timed out (the caller can fall back to
+             :func:`extract_flac_from_mp4`) :class:`bool`
+    """
+    try:
+        FFmpeg().option("y").input("pipe:0").output(str(file_out), {"f": "flac"}).execute(
+            stream=ChunksReader(chunks), timeout=timeout)
+        return True
+    except (FFmpegError, BrokenPipeError) as e:
+        log.warning(f"Error streaming FLAC from MP4 to {file_out} : {e}")
+        file_out.unlink(missing_ok=True)
+        return False
+    except subprocess.TimeoutExpired:
+        log.warning(f"Timeout streaming FLAC from MP4 to {file_out}")
+        file_out.unlink(missing_ok=True)
+        return False
+    except Exception:
+        # The download of the stream failed, don't leave a truncated file behind
+        file_out.unlink(missing_ok=True)
+        raise
+
+
 def get_size_of_folder(folder: Path) -> int:
     """Get the size of a folder in bytes."""
     return sum(file.stat().st_size for file in get_all_files_in_directory(folder))
@@ -3,6 +3,10 @@ import re
 
 from tidalapi import Artist
 
+PARENTHESES_PATTERN = re.compile(r'\((feat|with|edition|radio|bande|original|ultimate)[^)]*\)')
+UK_ALBUM_PATTERN = re.compile(r'\(uk.*?album\)')
+NON_ALPHANUMERIC_PATTERN = re.compile(r'\W+')
+
 
 def format_path(*parts):
     return "/".join(str(part).replace(" ", "_").lower() for part in parts)
@@ -40,14 +44,14 @@ def normalize(text: str) -> list[str]:
     text = text.lower()
 
     # Removes various stuff in parentheses (e.g. (feat. ...), (from ...), (edition ...), (radio ...), (bande ...), etc.)
-    text = re.sub(r'\((feat|with|edition|radio|bande|original|ultimate)[^)]*\)', '', text)
-    text = re.sub(r'\(uk.*?album\)', '', text)
+    text = PARENTHESES_PATTERN.sub('', text)
+    text = UK_ALBUM_PATTERN.sub('', text)
     text = text.replace("remix", "")
     # Removes date and version information (e.g. 2020 remaster, 2020 version, etc.)
     # text = re.sub(r'\d{4} (remaster|version)', '', text)
 
     tokens = text.split()
-    tokens = [re.sub(r'\W+', '', token) for token in tokens]  # Remove non-alphanumeric characters
+    tokens = [NON_ALPHANUMERIC_PATTERN.sub('', token) for token in tokens]  # Remove non-alphanumeric characters
 
     tokens = [token for token in tokens if token != '']
     return tokens
@@ -0,0 +1,51 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from spotidalyfin import cfg
+from spotidalyfin.utils.scheduler import MAX_ADAPTIVE_WORKERS
+
+# Connect and read timeouts (in seconds)
+DEFAULT_TIMEOUT = (5, 20)
+
+_sessions: dict[bool, requests.Session] = {}
+_session_lock = threading.Lock()
+
+
+def get_session(retry: bool = True) -> requests.Session:
+    """
+    Get an HTTP session shared by all the threads, created on first use.
+
+    Connections to the same hosts (Tidal CDN, cover images) are kept alive and reused. The pool is sized so that every
+    segment downloaded concurrently gets its own connection. With ``retry``, failed requests (connection errors, 5xx,
+    429) are retried with backoff; without it, they are left to the caller (e.g. :func:`download_segment`, which also
+    retries the failures while reading the response), so that requests are only retried in one place.
+
+    :param retry: Whether the failed requests are retried by the session
+    :return: Shared session :class:`requests.Session`
+    """
+    with _session_lock:
+        if retry not in _sessions:
+            workers = cfg.get("download-workers")
+            if cfg.get("adaptive-downloads"):
+                workers = max(workers, MAX_ADAPTIVE_WORKERS)
+            pool_size = max(10, workers * cfg.get("segment-workers") + 4)
+            if retry:
+                max_retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                                    allowed_methods=("GET", "HEAD"), respect_retry_after_header=True)
+            else:
+                max_retries = Retry(total=0, read=False)
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size, max_retries=max_retries)
+
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[retry] = session
+        return _sessions[retry]
+
+
+def get(url: str, timeout=DEFAULT_TIMEOUT, retry: bool = True, **kwargs) -> requests.Response:
+    """Send a GET request through a shared session (see :func:`get_session`)."""
+    return get_session(retry).get(url, timeout=timeout, **kwargs)
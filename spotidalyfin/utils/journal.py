@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+
+class DownloadJournal:
+    """
+    On-disk journal of the download of a track, kept next to its temporary file so that an interrupted run can resume
+    it: the segments already written (and their size), whether the download is complete, the current temporary file
+    (it changes once converted) and the metadata of the track (so that a complete download can be tagged and moved
+    without any network call).
+
+    The metadata is written once (the cover in a separate file), the journal itself is rewritten after each segment.
+    """
+
+    def __init__(self, directory: Path, track_id):
+        """
+        :param directory: Directory of the temporary files
+        :param track_id: ID of the Tidal track
+        """
+        self.path = directory / f"{track_id}.journal"
+        self.metadata_path = directory / f"{track_id}.metadata"
+        self.cover_path = directory / f"{track_id}.cover"
+        self.data = {}
+
+        if self.path.exists():
+            try:
+                self.data = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                self.data = {}
+
+    @property
+    def segments(self) -> Optional[int]:
+        """Total number of segments of the track, None if the download didn't start."""
+        return self.data.get("segments")
+
+    @property
+    def sizes(self) -> list[int]:
+        """Size of each segment already written, in order."""
+        return self.data.get("sizes", [])
+
+    @property
+    def complete(self) -> bool:
+        return self.data.get("complete", False)
+
+    @property
+    def converted(self) -> bool:
+        """Whether the temporary file was already converted (see :func:`set_file`)."""
+        return self.data.get("converted", False)
+
+    @property
+    def mime_type(self) -> Optional[str]:
+        return self.data.get("mime_type")
+
+    @property
+    def file(self) -> Optional[Path]:
+        """Current temporary file of the track."""
+        file = self.data.get("file")
+        return self.path.parent / file if file else None
+
+    def get_metadata(self) -> Optional[dict]:
+        """Get the metadata saved with :func:`save_metadata`, None if there is none."""
+        try:
+            metadata = json.loads(self.metadata_path.read_text())
+            metadata["cover_data"] = self.cover_path.read_bytes()
+            return metadata
+        except (OSError, ValueError):
+            return None
+
+    def save_metadata(self, metadata: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.cover_path.write_bytes(metadata.get("cover_data") or b"")
+        self.metadata_path.write_text(json.dumps({k: v for k, v in metadata.items() if k != "cover_data"}))
+
+    def start(self, file: Path, segments: int, mime_type: str):
+        """Start (or restart from scratch) the download of the track."""
+        self.data = {"file": file.name, "segments": segments, "mime_type": mime_type, "sizes": [], "complete": False}
+        self.save()
+
+    def add_segment(self, size: int):
+        """Record a segment written (and flushed) to the temporary file."""
+        self.data["sizes"].append(size)
+        self.data["complete"] = len(self.data["sizes"]) == self.data["segments"]
+        self.save()
+
+    def set_streamed(self, file: Path, sizes: list[int]):
+        """Record a download converted on the fly: only the converted file was written, not the segments."""
+        self.data.update(file=file.name, sizes=sizes, complete=True, converted=True)
+        self.save()
+
+    def set_file(self, file: Path, converted: bool):
+        """
+        Record the new temporary file of the track (e.g. once converted).
+
+        :param file: Temporary file of the track
+        :param converted: Whether the conversion succeeded (the conversion is tried again by the next run otherwise)
+        """
+        self.data["file"] = file.name
+        self.data["converted"] = converted
+        self.save()
+
+    def save(self):
+        # Written aside then renamed, so that an interruption never leaves a truncated journal
+        tmp_path = self.path.with_suffix(".journal.tmp")
+        tmp_path.write_text(json.dumps(self.data))
+        tmp_path.replace(self.path)
+
+    def remove(self):
+        """Remove the journal and the metadata of the track (once the track is moved to its final destination)."""
+        for path in (self.path, self.metadata_path, self.cover_path):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,141 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+
+from spotidalyfin.utils.logger import log
+from spotidalyfin.utils.metadata import get_track_ids
+
+if TYPE_CHECKING:
+    from spotidalyfin.db.database import Database
+
+
+class LibraryIndex:
+    """
+    Persistent index of the tracks of the output library, by path, Tidal ID and ISRC (read from the tags written by
+    :func:`set_audio_tags`), to know if a track is already downloaded without any network call or tree walk.
+
+    The index is stored in the database and refreshed incrementally: a directory is only listed again when its
+    modification time changed (the files of the other ones are only stat'ed, as rewriting a file in place doesn't
+    change the modification time of its directory), and only the new or modified files (path, modification time, size)
+    are read again, in parallel.
+    """
+
+    def __init__(self, root: Path, db: "Database", workers: int = 8):
+        """
+        :param root: Root of the library (the output directory)
+        :param db: Database storing the index
+        :param workers: Number of files read concurrently when refreshing the index
+        """
+        self.root = root
+        self.db = db
+        self.workers = workers
+        self.lock = threading.Lock()
+
+        self.paths: set[str] = set()
+        self.tidal_ids: set[str] = set()
+        self.isrcs: set[str] = set()
+
+    def refresh(self, full: bool = False):
+        """
+        Bring the index up to date with the library.
+
+        :param full: Whether to list every directory and check every file, whatever their modification time
+        """
+        known_dirs = self.db.get_library_dirs()
+        known_files = self.db.get_library_files()
+        children = {}
+        for path, (parent, _) in known_dirs.items():
+            children.setdefault(parent, []).append(path)
+        dir_files = {}
+        for path, (directory, *_) in known_files.items():
+            dir_files.setdefault(directory, []).append(path)
+
+        seen_dirs = set()
+        changed_dirs = []
+        listed_files = {}
+
+        # Directories are walked from the root, the ones not modified since the last refresh aren't listed again
+        pending = [(str(self.root), None)] if self.root.is_dir() else []
+        while pending:
+            directory, parent = pending.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            seen_dirs.add(directory)
+
+            if not full and directory in known_dirs and known_dirs[directory][1] == mtime:
+                pending.extend((child, directory) for child in children.get(directory, []))
+                for path in dir_files.get(directory, []):
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    listed_files[path] = (directory, stat.st_mtime, stat.st_size)
+                continue
+
+            changed_dirs.append((directory, parent, mtime))
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending.append((entry.path, directory))
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            listed_files[entry.path] = (directory, stat.st_mtime, stat.st_size)
+            except OSError as e:
+                log.debug(f"Could not list {directory}: {e}")
+
+        # Files gone (every file of a directory still there was listed or stat'ed), and files new or modified since read
+        removed_files = [path for path in known_files if path not in listed_files]
+        to_read = [path for path, (_, mtime, size) in listed_files.items()
+                   if known_files.get(path, (None, None, None))[1:3] != (mtime, size)]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            ids = list(executor.map(lambda path: get_track_ids(Path(path)), to_read))
+
+        files = [(path, *listed_files[path], tidal_id, isrc) for path, (tidal_id, isrc) in zip(to_read, ids)]
+        removed_dirs = [path for path in known_dirs if path not in seen_dirs]
+        self.db.update_library(dirs=changed_dirs, files=files, removed_dirs=removed_dirs, removed_files=removed_files)
+        log.debug(f"Library index refreshed: {len(changed_dirs)} directories listed, {len(files)} files read, "
+                  f"{len(removed_files)} files and {len(removed_dirs)} directories removed")
+
+        with self.lock:
+            self.paths.clear()
+            self.tidal_ids.clear()
+            self.isrcs.clear()
+            for path, (_, _, _, tidal_id, isrc) in self.db.get_library_files().items():
+                self.index(path, tidal_id, isrc)
+
+    def index(self, path: str, tidal_id: Optional[str], isrc: Optional[str]):
+        """Add a file to the in-memory sets (called with the lock held)."""
+        self.paths.add(path)
+        if tidal_id:
+            self.tidal_ids.add(str(tidal_id))
+        if isrc:
+            self.isrcs.add(isrc.upper())
+
+    def contains(self, path: Path = None, tidal_id=None, isrc: str = None) -> bool:
+        """Check if a track is in the library, by path, Tidal ID or ISRC."""
+        with self.lock:
+            return ((path is not None and str(path) in self.paths)
+                    or (tidal_id is not None and str(tidal_id) in self.tidal_ids)
+                    or (bool(isrc) and isrc.upper() in self.isrcs))
+
+    def add(self, path: Path, tidal_id=None, isrc: str = None):
+        """Record a track added to the library."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return
+
+        tidal_id = str(tidal_id) if tidal_id is not None else None
+        self.db.update_library(files=[(str(path), str(path.parent), stat.st_mtime, stat.st_size, tidal_id, isrc)])
+        with self.lock:
+            self.index(str(path), tidal_id, isrc)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.paths)
@@ -1,16 +1,25 @@
 from pathlib import Path
+from typing import Optional
 
+import mutagen
 from mutagen.flac import FLAC, Picture
 from mutagen.id3 import TALB, TCOP, TDRC, TIT2, TOPE, TPE1, TRCK, TSRC, USLT, ID3, APIC
 from mutagen.mp3 import MP3
 from tidalapi import Track
 
 from spotidalyfin import cfg
-from spotidalyfin.utils.file_utils import open_image_url
+from spotidalyfin.utils.covers import get_album_cover
 from spotidalyfin.utils.formatting import not_none, format_artists, num
 
 
-def get_track_metadata(track: Track) -> dict:
+def get_track_metadata(track: Track, include_cover: bool = True) -> dict:
+    """
+    Get the metadata of a track to embed in its file.
+
+    :param track: Tidal track (with its lyrics set, if any)
+    :param include_cover: Whether to get the cover data, the only part that can require a network call
+    :return: Metadata of the track :class:`dict`
+    """
     metadata = dict()
     metadata["title"] = not_none(track.full_name)
     metadata["album"] = not_none(track.album.name)
@@ -25,7 +34,8 @@ def get_track_metadata(track: Track) -> dict:
     metadata["isrc"] = not_none(track.isrc)
     metadata["lyrics"] = not_none(track.lyrics)
     metadata["cover_url"] = not_none(track.album.image(1280))
-    metadata["cover_data"] = open_image_url(metadata["cover_url"])
+    if include_cover:
+        metadata["cover_data"] = get_album_cover(track.album.id, metadata["cover_url"], 1280)
     if hasattr(track, "spotify_id"):
         metadata["spotify_id"] = track.spotify_id
     metadata["tidal_id"] = not_none(track.id)
@@ -77,6 +87,30 @@ def set_audio_tags(file: Path, metadata: dict):
         audio.save()
 
 
+def get_track_ids(file: Path) -> tuple[Optional[str], Optional[str]]:
+    """
+    Read the Tidal ID and the ISRC written by :func:`set_audio_tags` in a file.
+
+    :return: Tidal ID and ISRC of the track (None if missing or unreadable) :class:`tuple[str, str]`
+    """
+    try:
+        audio = mutagen.File(file)
+    except Exception:
+        return None, None
+    if audio is None or audio.tags is None:
+        return None, None
+
+    def get_tag(*keys) -> Optional[str]:
+        for key in keys:
+            value = audio.tags.get(key)
+            if value:
+                value = value[0] if isinstance(value, list) else getattr(value, "text", [value])[0]
+                return str(value) or None
+        return None
+
+    return get_tag("tidal_id", "TXXX:tidal_id"), get_tag("isrc", "TSRC")
+
+
 def format_track_path_from_metadata(metadata: dict, suffix: str = None) -> Path:
     def get_num(value, length=2):
         """Convert value to a zero-padded number string of specified length."""
@@ -0,0 +1,151 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_END = object()
+
+
+class _Failure:
+    """Wraps an exception raised by a producer so it can be re-raised by the consumer."""
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+def buffered(iterable: Iterable[T], maxsize: int) -> Iterator[T]:
+    """
+    Consume an iterable in a background thread and hand its items over through a bounded queue.
+
+    This allows the stages of a pipeline (written as generators) to run concurrently, the producer being blocked as
+    soon as ``maxsize`` items are waiting so that nothing is buffered beyond that. Exceptions raised by the producer
+    are re-raised in the consumer.
+
+    :param iterable: Iterable to consume in the background (e.g. the generator of the previous stage)
+    :param maxsize: Maximum number of items waiting in the queue
+    :return: Iterator over the items of the iterable :class:`Iterator`
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # Regularly check if the consumer is gone so the producer doesn't stay blocked on a full queue forever
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(_Failure(e))
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        while True:
+            item = items.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.exception
+            yield item
+    finally:
+        stopped.set()
+
+
+def ordered_map(func: Callable[[T], R], iterable: Iterable[T], max_workers: int, window: int = None) -> Iterator[R]:
+    """
+    Like :func:`ThreadPoolExecutor.map` (results are yielded in the order of the inputs), but only ``window`` calls
+    are submitted ahead of the consumer instead of all of them at once.
+
+    :param func: Function to call on each item
+    :param iterable: Items to process
+    :param max_workers: Number of threads
+    :param window: Maximum number of calls in flight or waiting to be consumed (default: twice the number of threads)
+    :return: Iterator over the results :class:`Iterator`
+    """
+    max_workers = max(1, max_workers)
+    window = max(1, window or max_workers * 2)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending: deque[Future] = deque()
+
+    try:
+        for item in iterable:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def unordered_map(func: Callable[[T], R], iterable: Iterable[T], max_workers: int, window: int = None) -> Iterator[R]:
+    """
+    Like :func:`ordered_map`, but the results are yielded as soon as they are available, whatever the order of the
+    inputs.
+
+    The inputs are consumed (and submitted) in a background thread, so that the results keep being yielded while the
+    next input is awaited (e.g. while the previous stage waits for the next page of an API).
+
+    :param func: Function to call on each item
+    :param iterable: Items to process
+    :param max_workers: Number of threads
+    :param window: Maximum number of calls in flight or waiting to be consumed (default: twice the number of threads)
+    :return: Iterator over the results :class:`Iterator`
+    """
+    max_workers = max(1, max_workers)
+    window = max(1, window or max_workers * 2)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    # Finished futures, then the number of submitted calls once the inputs are exhausted (or the producer's failure)
+    results = queue.Queue()
+    slots = threading.Semaphore(window)
+    stopped = threading.Event()
+
+    def submit():
+        submitted = 0
+        try:
+            for item in iterable:
+                # Regularly check if the consumer is gone so the producer doesn't stay blocked forever
+                while not slots.acquire(timeout=0.2):
+                    if stopped.is_set():
+                        return
+                if stopped.is_set():
+                    return
+                executor.submit(func, item).add_done_callback(results.put)
+                submitted += 1
+            results.put((_END, submitted))
+        except BaseException as e:
+            results.put(_Failure(e))
+
+    threading.Thread(target=submit, daemon=True).start()
+
+    try:
+        consumed, submitted = 0, None
+        while submitted is None or consumed < submitted:
+            result = results.get()
+            if isinstance(result, _Failure):
+                raise result.exception
+            if isinstance(result, tuple) and result[0] is _END:
+                submitted = result[1]
+                continue
+
+            consumed += 1
+            slots.release()
+            yield result.result()
+    finally:
+        stopped.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket pacing the calls to an API before they are sent, shared by all the threads of the process.
+
+    The rate adapts itself (AIMD): it is increased additively after each successful call and cut multiplicatively as
+    soon as the server throttles, so that the throughput stays close to the allowed ceiling instead of alternating
+    between bursts and long backoffs.
+    """
+
+    def __init__(self, rate: float = 4.0, burst: int = 4, min_rate: float = 0.5, max_rate: float = 20.0,
+                 increase: float = 0.02, decrease: float = 0.5):
+        """
+        :param rate: Initial rate (calls per second)
+        :param burst: Maximum number of calls sent without waiting after an idle period
+        :param min_rate: Lowest rate the limiter can decrease to
+        :param max_rate: Highest rate the limiter can increase to
+        :param increase: Rate added after each successful call
+        :param decrease: Factor applied to the rate when the server throttles
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.decreased_at = 0.0
+        self.lock = threading.Lock()
+
+        self.calls = 0
+        self.throttles = 0
+        self.wait_time = 0.0
+
+    def acquire(self):
+        """Wait until a call can be sent."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+            # The token is reserved right away, callers queue up by letting the bucket go negative
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+            self.calls += 1
+            self.wait_time += delay
+
+        if delay:
+            time.sleep(delay)
+
+    def on_success(self):
+        """Additive increase of the rate after a successful call."""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        """Multiplicative decrease of the rate when the server throttles."""
+        with self.lock:
+            self.throttles += 1
+
+            # Concurrent calls are throttled together, only count them as one decrease
+            now = time.monotonic()
+            if now - self.decreased_at < 1 / self.rate:
+                return
+
+            self.decreased_at = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+
+    def stats(self) -> dict:
+        """Get the statistics of the limiter (calls, throttles, total and average wait time, current rate)."""
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "throttles": self.throttles,
+                "wait_time": round(self.wait_time, 2),
+                "avg_wait_time": round(self.wait_time / self.calls, 3) if self.calls else 0.0,
+                "rate": round(self.rate, 2)
+            }
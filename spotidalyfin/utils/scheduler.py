@@ -0,0 +1,184 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable
+
+from spotidalyfin.utils.logger import log
+
+# Highest number of concurrent downloads reached in adaptive mode
+MAX_ADAPTIVE_WORKERS = 16
+
+
+class DownloadScheduler:
+    """
+    Runs downloads concurrently and measures the achieved throughput.
+
+    The tasks must return the number of bytes they downloaded. In adaptive mode, the number of concurrent downloads is
+    tuned while running (hill climbing): every ``interval`` seconds, the concurrency keeps moving in the same direction
+    as long as it improves the throughput, stays put when the throughput is flat, goes the other way when it drops,
+    and is halved when errors (e.g. timeouts on a congested link) show up.
+
+    The throughput is measured over the time at least one download is in flight, so that waiting for the upstream
+    stages (e.g. a slow matching) doesn't count as slow downloads, and windows where the downloads were starved (not
+    enough submitted to fill the concurrency) don't change it.
+    """
+
+    def __init__(self, workers: int, adaptive: bool = False, min_workers: int = 1,
+                 max_workers: int = MAX_ADAPTIVE_WORKERS, interval: float = 10.0):
+        """
+        :param workers: Number of concurrent downloads (initial one in adaptive mode)
+        :param adaptive: Whether the number of concurrent downloads is tuned while running
+        :param min_workers: Lowest number of concurrent downloads in adaptive mode
+        :param max_workers: Highest number of concurrent downloads in adaptive mode
+        :param interval: Minimum time (in seconds) between two adjustments in adaptive mode
+        """
+        self.adaptive = adaptive
+        self.min_workers = max(1, min(min_workers, workers))
+        self.max_workers = max(workers, max_workers) if adaptive else workers
+        self.workers = max(1, workers)
+        self.interval = interval
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="download")
+        self.condition = threading.Condition()
+        self.active = 0
+
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.downloaded_bytes = 0
+        self.tasks = 0
+        self.errors = 0
+
+        # Time with at least one download in flight, and with every download slot in use
+        self.busy_time = 0.0
+        self.saturated_time = 0.0
+        self.changed_at = self.started_at
+
+        # State of the current adjustment window
+        self.window_started_at = self.started_at
+        self.window_busy_time = 0.0
+        self.window_saturated_time = 0.0
+        self.window_bytes = 0
+        self.window_tasks = 0
+        self.window_errors = 0
+        self.last_throughput = None
+        self.direction = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def submit(self, func: Callable[..., int], *args, **kwargs) -> Future:
+        """Submit a download, waiting until it can start (the number of concurrent downloads is bounded)."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.active < self.workers)
+            self.account(time.monotonic())
+            self.active += 1
+
+        return self.executor.submit(self.run, func, *args, **kwargs)
+
+    def run(self, func: Callable[..., int], *args, **kwargs) -> int:
+        downloaded_bytes, failed = 0, False
+        try:
+            downloaded_bytes = func(*args, **kwargs) or 0
+            return downloaded_bytes
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self.condition:
+                self.account(time.monotonic())
+                self.active -= 1
+                self.record(downloaded_bytes, failed)
+                self.condition.notify_all()
+
+    def account(self, now: float):
+        """Account the time since the number of downloads in flight last changed (called with the condition held)."""
+        elapsed = now - self.changed_at
+        self.changed_at = now
+        if self.active:
+            self.busy_time += elapsed
+            self.window_busy_time += elapsed
+        if self.active >= self.workers:
+            self.saturated_time += elapsed
+            self.window_saturated_time += elapsed
+
+    def record_error(self):
+        """Record a download that failed after it was reported as finished (e.g. while being finalized)."""
+        with self.condition:
+            self.errors += 1
+            self.window_errors += 1
+
+    def record(self, downloaded_bytes: int, failed: bool):
+        """Record a finished download and adjust the concurrency if needed (called with the condition held)."""
+        self.tasks += 1
+        self.downloaded_bytes += downloaded_bytes
+        self.errors += failed
+        self.window_tasks += 1
+        self.window_bytes += downloaded_bytes
+        self.window_errors += failed
+
+        now = time.monotonic()
+        elapsed = now - self.window_started_at
+        if not self.adaptive or elapsed < self.interval or self.window_tasks < self.workers:
+            return
+
+        throughput = self.window_bytes / self.window_busy_time if self.window_busy_time else 0.0
+        error_rate = min(1.0, self.window_errors / self.window_tasks)
+
+        if self.window_saturated_time < elapsed / 2 and error_rate <= 0.1:
+            # Downloads were waiting for the upstream stages, the throughput doesn't tell anything about the concurrency
+            log.debug(f"Download throughput: {throughput / 1024 ** 2:.2f} MB/s, downloads starved, "
+                      f"concurrent downloads: {self.workers}")
+            self.reset_window(now)
+            return
+
+        if error_rate > 0.1:
+            # Errors mean the link (or the server) is saturated, back off right away
+            self.direction = -1
+            self.workers = max(self.min_workers, self.workers // 2)
+        else:
+            gain = throughput / self.last_throughput - 1 if self.last_throughput else 1.0
+            if gain < -0.05:
+                # The last change made things worse, go the other way
+                self.direction = -self.direction
+            if abs(gain) >= 0.05:
+                self.workers = min(self.max_workers, max(self.min_workers, self.workers + self.direction))
+
+        log.debug(f"Download throughput: {throughput / 1024 ** 2:.2f} MB/s, errors: {error_rate:.0%}, "
+                  f"concurrent downloads: {self.workers}")
+
+        self.last_throughput = throughput
+        self.reset_window(now)
+
+    def reset_window(self, now: float):
+        self.window_started_at = now
+        self.window_busy_time = 0.0
+        self.window_saturated_time = 0.0
+        self.window_bytes = 0
+        self.window_tasks = 0
+        self.window_errors = 0
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the downloads (tracks, errors, bytes, elapsed time, time with downloads in flight,
+        throughput in MB/s over that time, workers).
+        """
+        with self.condition:
+            now = self.finished_at or time.monotonic()
+            busy = self.busy_time + (now - self.changed_at if self.active else 0.0)
+            return {
+                "tasks": self.tasks,
+                "errors": self.errors,
+                "downloaded_bytes": self.downloaded_bytes,
+                "elapsed": round(now - self.started_at, 2),
+                "busy": round(busy, 2),
+                "mb_per_s": round(self.downloaded_bytes / 1024 ** 2 / busy, 2) if busy else 0.0,
+                "workers": self.workers
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        with self.condition:
+            self.finished_at = time.monotonic()
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from spotidalyfin import cfg
+from spotidalyfin.cli import handle_download, match_spotify_tracks, match_spotify_with_tidal
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    previous = {key: cfg.get(key) for key in ("retry-unmatched", "ignore-jellyfin", "group-albums", "quality")}
+    cfg.put("retry-unmatched", False)
+    cfg.put("ignore-jellyfin", True)
+    cfg.put("group-albums", True)
+    cfg.put("quality", 3)
+    yield
+    for key, value in previous.items():
+        cfg.put(key, value)
+
+
+def spotify_track(track_id: str) -> SimpleNamespace:
+    return SimpleNamespace(id=track_id, name=track_id, artist="Artist", album_name="Album", album_id="album",
+                           album_upc="upc", added_at=f"2024-01-0{track_id[-1]}T00:00:00Z")
+
+
+@pytest.fixture
+def managers():
+    """A needs a search (not found), B is in the database, C needs a search (found)."""
+    db = mock.Mock()
+    db.get_tidal_track_from_database.side_effect = lambda spotify_id, _: SimpleNamespace(id=42) if spotify_id == "B1" \
+        else None
+    db.should_search_unmatched.return_value = True
+
+    tidal_manager = mock.Mock()
+    tidal_manager.match_album_tracks.return_value = {}
+    tidal_manager.search_spotify_track.side_effect = lambda track, *args, **kwargs: SimpleNamespace(
+        id=7, full_name="C", artist=SimpleNamespace(name="Artist"), album=SimpleNamespace(name="Album"),
+        real_quality="LOSSLESS", real_quality_score=3) if track.id == "C3" else None
+    return tidal_manager, mock.Mock(), mock.Mock(), db
+
+
+def test_match_spotify_tracks_keeps_input_order(managers):
+    tracks = [spotify_track("A1"), spotify_track("B1"), spotify_track("C3")]
+    results = match_spotify_tracks(tracks, *managers)
+
+    assert [(tidal_track and tidal_track.id, outcome) for tidal_track, outcome in results] == [
+        (None, "unmatched"), (42, "matched"), (7, "matched")]
+
+
+def test_match_spotify_with_tidal_reports_each_track_outcome(managers):
+    tracks = [spotify_track("A1"), spotify_track("B1"), spotify_track("C3")]
+    matched = []
+    tidal_tracks = list(match_spotify_with_tidal([tracks], *managers, on_matched=lambda track, tidal_track, outcome:
+                                                 matched.append((track.id, tidal_track and tidal_track.id, outcome))))
+
+    assert sorted(matched) == [("A1", None, "unmatched"), ("B1", 42, "matched"), ("C3", 7, "matched")]
+    assert sorted(tidal_track.id for tidal_track in tidal_tracks) == [7, 42]
+
+
+def test_handle_download_only_saves_fully_handled_playlists(tmp_path, monkeypatch):
+    playlists = {"complete": ["A1", "B1"], "unmatched": ["C1", "D1"], "failed": ["E1", "F1"]}
+    (tmp_path / "playlists.txt").write_text("\n".join(playlists))
+
+    spotify_manager = mock.Mock()
+    spotify_manager.get_playlist_snapshot.side_effect = lambda url: (url, f"snapshot-{url}")
+    spotify_manager.iter_playlist_tracks.side_effect = lambda playlist_id: iter(
+        [[SimpleNamespace(id=track_id, album_id=None, album_upc=None, added_at=None) for track_id in playlists[playlist_id]]])
+    db = mock.Mock()
+    db.get_state.return_value = None
+
+    def match(tracks, *args):
+        return [(None, "unmatched") if track.id == "D1" else (SimpleNamespace(id=f"tidal-{track.id}"), "matched")
+                for track in tracks]
+
+    def download(tidal_tracks, tidal_manager, db, progress, on_failed):
+        for tidal_track in tidal_tracks:
+            if tidal_track.id == "tidal-F1":
+                on_failed(tidal_track)
+
+    monkeypatch.setattr("spotidalyfin.cli.match_spotify_tracks", match)
+    monkeypatch.setattr("spotidalyfin.cli.download_tidal_tracks", download)
+    handle_download("file", spotify_manager, mock.Mock(), mock.Mock(), db, file_path=tmp_path / "playlists.txt")
+
+    db.put_states.assert_called_once_with({"playlist:download:complete": "snapshot-complete"})
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from spotidalyfin.managers.jellyfin_manager import JellyfinManager
+
+
+class FakePlaylist:
+    """In-memory Jellyfin playlist (entries are (PlaylistItemId, track ID))."""
+
+    def __init__(self, track_ids):
+        self.entries = [(f"entry-{track_id}", track_id) for track_id in track_ids]
+
+    def add(self, track_ids, playlist_id, user_id):
+        self.entries.extend((f"entry-{track_id}", track_id) for track_id in track_ids)
+
+    def items(self, playlist_id, user_id):
+        return [{"PlaylistItemId": entry_id, "Id": track_id} for entry_id, track_id in self.entries]
+
+    def move(self, playlist_id, entry_id, index):
+        entry = next(entry for entry in self.entries if entry[0] == entry_id)
+        self.entries.remove(entry)
+        self.entries.insert(index, entry)
+
+    @property
+    def track_ids(self):
+        return [track_id for _, track_id in self.entries]
+
+
+@pytest.fixture
+def jellyfin():
+    manager = JellyfinManager("http://jellyfin", "key")
+    manager.get_user_id_from_username = mock.Mock(return_value="user")
+    manager.get_playlist_id_from_name = mock.Mock(return_value="playlist")
+    manager.create_playlist = mock.Mock()
+    return manager
+
+
+def sync_liked(jellyfin, playlist, tracks, in_jellyfin):
+    jellyfin.get_track_from_data = lambda track: {"Id": track.id} if track.id in in_jellyfin else None
+    with mock.patch.multiple(jellyfin, add_tracks_to_playlist=playlist.add, get_playlist_items=playlist.items,
+                             move_playlist_item=playlist.move):
+        return jellyfin.sync_playlist(tracks, "user", append=True)
+
+
+def test_sync_playlist_keeps_missing_tracks_pending(jellyfin):
+    playlist = FakePlaylist(["old1", "old2"])
+    tracks = [SimpleNamespace(id=track_id) for track_id in ("new1", "new2", "new3")]
+
+    # new2 isn't in Jellyfin yet: the playlist isn't fully synced
+    assert not sync_liked(jellyfin, playlist, tracks, {"new1", "new3"})
+    assert playlist.track_ids == ["new1", "new3", "old1", "old2"]
+
+    # Synced again with the same songs once it is, the songs already added aren't added twice
+    assert sync_liked(jellyfin, playlist, tracks, {"new1", "new2", "new3"})
+    assert playlist.track_ids == ["new1", "new2", "new3", "old1", "old2"]
+    jellyfin.create_playlist.assert_not_called()
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from spotidalyfin.db.database import Database
+from spotidalyfin.utils import library
+from spotidalyfin.utils.library import LibraryIndex
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    # The IDs are read from the file content instead of the audio tags
+    monkeypatch.setattr(library, "get_track_ids", lambda path: tuple(path.read_text().split(",")))
+    root = tmp_path / "library"
+    root.mkdir()
+    with Database(tmp_path / "spotidalyfin.db") as db:
+        yield LibraryIndex(root, db)
+
+
+def add_track(root, artist, album, name, tidal_id, isrc):
+    path = root / artist / album / f"{name}.flac"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"{tidal_id},{isrc}")
+    return path
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_refresh_removes_tracks_of_deleted_directories(index, full):
+    kept = add_track(index.root, "Artist A", "Album", "Track 1", "1", "ISRC1")
+    deleted = add_track(index.root, "Artist B", "Album", "Track 2", "2", "ISRC2")
+    index.refresh()
+    assert index.contains(tidal_id="2") and index.contains(path=deleted)
+
+    for path in (deleted, deleted.parent):
+        path.unlink() if path.is_file() else path.rmdir()
+    deleted.parent.parent.rmdir()
+    index.refresh(full=full)
+
+    assert not index.contains(path=deleted)
+    assert not index.contains(tidal_id="2")
+    assert not index.contains(isrc="ISRC2")
+    assert index.contains(path=kept, tidal_id="1", isrc="ISRC1")
+    assert len(index) == 1
+    assert all(not path.startswith(str(index.root / "Artist B")) for path in index.db.get_library_dirs())
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_refresh_reads_modified_files_again(index, full):
+    path = add_track(index.root, "Artist", "Album", "Track", "1", "ISRC1")
+    index.refresh()
+    assert index.contains(tidal_id="1")
+
+    # Same directory entries (the directory mtime doesn't change), new content and file mtime
+    path.write_text("10,ISRC10")
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    directory_mtime = path.parent.stat().st_mtime
+    os.utime(path.parent, (directory_mtime, directory_mtime))
+    index.refresh(full=full)
+
+    assert index.contains(tidal_id="10", isrc="ISRC10")
+    assert not index.contains(tidal_id="1")
+    assert not index.contains(isrc="ISRC1")
+
+
+def test_refresh_reads_files_added_to_a_directory(index):
+    add_track(index.root, "Artist", "Album", "Track 1", "1", "ISRC1")
+    index.refresh()
+
+    added = add_track(index.root, "Artist", "Album", "Track 2", "2", "ISRC2")
+    index.refresh()
+
+    assert index.contains(path=added, tidal_id="2", isrc="ISRC2")
+    assert index.contains(tidal_id="1")
+    assert len(index) == 2
@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pytest
+
+from spotidalyfin.utils.pipeline import unordered_map
+
+
+def test_unordered_map_yields_results():
+    assert sorted(unordered_map(lambda x: x * 2, range(20), max_workers=4, window=3)) == [x * 2 for x in range(20)]
+
+
+def test_unordered_map_yields_results_while_the_input_is_blocked():
+    first_result = threading.Event()
+
+    def inputs():
+        yield 1
+        # Like a stage waiting for the next page, only unblocked once the first result has been consumed
+        assert first_result.wait(timeout=5), "the result was not yielded while the input was blocked"
+        yield 2
+
+    def slow(x):
+        time.sleep(0.1)
+        return x
+
+    results = []
+    for result in unordered_map(slow, inputs(), max_workers=2):
+        results.append(result)
+        first_result.set()
+
+    assert results == [1, 2]
+
+
+def test_unordered_map_raises_exceptions():
+    def inputs():
+        yield 1
+        raise ValueError("input")
+
+    with pytest.raises(ValueError, match="input"):
+        list(unordered_map(lambda x: x, inputs(), max_workers=2))
+
+    def fail(x):
+        raise ValueError("call")
+
+    with pytest.raises(ValueError, match="call"):
+        list(unordered_map(fail, range(3), max_workers=2))